@@ -0,0 +1,238 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.m4a')
+MANIFEST_NAME = 'batch_manifest.json'
+METRICS_NAME = 'batch_metrics.jsonl'
+# Same default as spleeter_utils.DEFAULT_SILENCE_MODE, read here so the
+# parent process does not import the separation stack
+DEFAULT_SILENCE_MODE = os.environ.get('KARAOKE_SILENCE_GATE', 'zeros')
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# INPUT DISCOVERY
+# =============================================================================
+def collect_inputs(patterns):
+    """Expand directories and glob patterns into a sorted list of audio files"""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, _, filenames in os.walk(pattern):
+                for name in filenames:
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        files.add(os.path.abspath(os.path.join(dirpath, name)))
+            continue
+        for path in glob.glob(pattern, recursive=True):
+            if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS):
+                files.add(os.path.abspath(path))
+    return sorted(files)
+
+
+def output_dir_for(input_path, output_root, taken):
+    """Per-file output folder named after the input, disambiguated on clashes"""
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    if name in taken:
+        digest = hashlib.sha1(input_path.encode('utf-8')).hexdigest()[:8]
+        name = f"{name}_{digest}"
+    taken.add(name)
+    return os.path.join(output_root, name)
+
+# =============================================================================
+# JOB MANIFEST
+# =============================================================================
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {'jobs': {}}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {str(e)}")
+        return {'jobs': {}}
+
+
+def save_manifest(path, manifest):
+    """Write the manifest atomically so a crash never leaves it half-written"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+# =============================================================================
+# WORKER PROCESS
+# =============================================================================
+def _init_worker(stems, only, cache_dir, metrics_path, workers):
+    import tracing
+    import thread_tuner
+    # Every worker process gets its share of the cores
+    thread_tuner.configure(os.path.join(cache_dir, 'thread_profiles.json') if cache_dir else None,
+                           concurrent_jobs=workers)
+    from spleeter_utils import warm_up_models, plan_stems, configure_pcm_cache
+    tracing.configure(metrics_path=metrics_path,
+                      rtf_path=os.path.join(cache_dir, 'realtime_factors.json') if cache_dir else None)
+    if cache_dir:
+        configure_pcm_cache(os.path.join(cache_dir, 'pcm'))
+    warm_up_models(plan_stems(stems, only)[0], background=False)
+
+
+def _stem_duration(output_dir):
+    """Duration in seconds of the first stem written to `output_dir`"""
+    from spleeter_utils import probe_duration
+    for name in sorted(os.listdir(output_dir)):
+        if name.lower().endswith(('.wav', '.flac', '.mp3', '.opus')):
+            return probe_duration(os.path.join(output_dir, name)) or 0.0
+    return 0.0
+
+
+def _run_job(input_path, output_dir, stems, chunk_seconds, cache_dir, output_format, quality,
+             only, silence):
+    from spleeter_utils import separate_music
+    result_cache = None
+    if cache_dir:
+        from result_cache import ResultCache
+        result_cache = ResultCache(os.path.join(cache_dir, 'results'))
+    start = time.perf_counter()
+    separate_music(input_path, output_dir, stems=stems, chunk_seconds=chunk_seconds,
+                   result_cache=result_cache, output_format=output_format, quality=quality,
+                   only=only, silence=silence)
+    elapsed = time.perf_counter() - start
+    return {'seconds': elapsed, 'audio_seconds': _stem_duration(output_dir)}
+
+# =============================================================================
+# BATCH RUNNER
+# =============================================================================
+def run_batch(inputs, output_root, stems=2, workers=1, chunk_seconds=None, resume=True,
+              cache_dir=None, output_format='wav', quality=None, only=None, silence=DEFAULT_SILENCE_MODE):
+    """
+    Separate every file in `inputs` across `workers` processes, each holding
+    its own warm model. Progress is recorded in a manifest inside
+    `output_root` so an interrupted batch picks up where it stopped; files
+    finished with different output settings are redone.
+    """
+    os.makedirs(output_root, exist_ok=True)
+    manifest_path = os.path.join(output_root, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path) if resume else {'jobs': {}}
+    jobs = manifest.setdefault('jobs', {})
+
+    # Everything that changes the written stems; a file done with other
+    # settings is separated again
+    settings = {'stems': stems, 'format': output_format, 'quality': quality, 'only': only,
+                'silence': silence}
+    taken = {os.path.basename(job['output_dir']) for job in jobs.values()}
+    pending = []
+    for input_path in inputs:
+        job = jobs.get(input_path)
+        if (job and job.get('status') == 'done' and os.path.isdir(job['output_dir'])
+                and all(job.get(name) == value for name, value in settings.items())):
+            continue
+        if not job:
+            job = {'output_dir': output_dir_for(input_path, output_root, taken)}
+            jobs[input_path] = job
+        job.update(status='pending', **settings)
+        pending.append(input_path)
+    save_manifest(manifest_path, manifest)
+
+    skipped = len(inputs) - len(pending)
+    if skipped:
+        print(f"Resuming: {skipped} file(s) already done")
+
+    started = time.perf_counter()
+    processed = failed = 0
+    audio_total = 0.0
+    if pending:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(stems, only, cache_dir,
+                                           os.path.join(output_root, METRICS_NAME),
+                                           workers)) as pool:
+            futures = {
+                pool.submit(_run_job, path, jobs[path]['output_dir'], stems, chunk_seconds,
+                            cache_dir, output_format, quality, only, silence): path
+                for path in pending
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                job = jobs[path]
+                try:
+                    job.update(status='done', **future.result())
+                    processed += 1
+                    audio_total += job['audio_seconds']
+                    print(f"✅ {path} -> {job['output_dir']} ({job['seconds']:.1f}s)")
+                except Exception as e:
+                    job.update(status='failed', error=str(e).split('\n')[0])
+                    failed += 1
+                    print(f"❌ {path}: {job['error']}")
+                save_manifest(manifest_path, manifest)
+
+    wall = time.perf_counter() - started
+    summary = {
+        'processed': processed,
+        'failed': failed,
+        'skipped': skipped,
+        'wall_seconds': wall,
+        'files_per_minute': processed / wall * 60 if wall else 0.0,
+        'realtime_factor': wall / audio_total if audio_total else 0.0,
+    }
+    manifest['last_run'] = summary
+    save_manifest(manifest_path, manifest)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Separate a batch of audio files without the GUI")
+    parser.add_argument('inputs', nargs='+', help="Audio files, directories or glob patterns")
+    parser.add_argument('-s', '--stems', type=int, choices=(2, 4, 5), default=2)
+    parser.add_argument('-o', '--output', default=os.path.join(os.getcwd(), 'output'),
+                        help="Root folder for per-file output folders")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="Worker processes, each with its own warm model")
+    parser.add_argument('--chunk-seconds', type=float, default=None,
+                        help="Stream long files in windows of this many seconds")
+    parser.add_argument('-f', '--format', choices=('wav', 'flac', 'mp3', 'opus'), default='wav',
+                        help="Output format for the stems")
+    parser.add_argument('-q', '--quality', type=int, default=None,
+                        help="FLAC compression level, or MP3/Opus bitrate in kbps")
+    parser.add_argument('--only', default=None,
+                        help="Comma-separated stems to write, e.g. vocals,instrumental")
+    parser.add_argument('--silence', choices=('off', 'zeros', 'passthrough'),
+                        default=DEFAULT_SILENCE_MODE,
+                        help="Skip the model on silent stretches, writing zeros or passing "
+                             "the input through to the accompaniment "
+                             "(default: $KARAOKE_SILENCE_GATE or zeros)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Cache folder for finished results and decoded audio")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="Ignore an existing manifest and redo every file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("No audio files found.")
+        return 1
+
+    print(f"Separating {len(inputs)} file(s) into {args.stems} stems with {args.workers} worker(s)")
+    summary = run_batch(inputs, os.path.abspath(args.output), stems=args.stems,
+                        workers=args.workers, chunk_seconds=args.chunk_seconds,
+                        resume=not args.no_resume, cache_dir=args.cache_dir,
+                        output_format=args.format, quality=args.quality,
+                        only=args.only.split(',') if args.only else None,
+                        silence=args.silence)
+    print(f"Done: {summary['processed']} processed, {summary['failed']} failed, "
+          f"{summary['skipped']} skipped in {summary['wall_seconds']:.1f}s")
+    print(f"Throughput: {summary['files_per_minute']:.2f} files/min, "
+          f"real-time factor {summary['realtime_factor']:.3f}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+FIXTURE_KINDS = ('tones', 'noise', 'clicks', 'mix')
+DEFAULT_DURATIONS = (10, 30)
+DEFAULT_FORMATS = ('wav', 'mp3')
+DEFAULT_STEMS = (2, 4, 5)
+# Lower is better for every compared metric
+COMPARED_METRICS = ('decode_s', 'model_s', 'inference_s', 'save_s', 'total_s', 'rtf',
+                    'peak_rss_mb', 'output_mb')
+
+# =============================================================================
+# SYNTHETIC FIXTURES
+# =============================================================================
+def synthesize(kind, seconds, sample_rate=SAMPLE_RATE, seed=0):
+    """Deterministic stereo float32 test signal; no network or assets needed"""
+    frames = int(seconds * sample_rate)
+    t = np.arange(frames, dtype=np.float64) / sample_rate
+    rng = np.random.default_rng(seed)
+    if kind == 'tones':
+        # A major chord with a slow vibrato on the top note
+        left = (np.sin(2 * np.pi * 220.0 * t) + np.sin(2 * np.pi * 277.18 * t)
+                + np.sin(2 * np.pi * 329.63 * t + 0.5 * np.sin(2 * np.pi * 5 * t))) / 3
+        right = np.roll(left, sample_rate // 100)
+        signal = np.stack([left, right], axis=1)
+    elif kind == 'noise':
+        signal = rng.standard_normal((frames, 2)) * 0.2
+    elif kind == 'clicks':
+        signal = np.zeros((frames, 2))
+        signal[::sample_rate // 4] = 0.9  # 240 BPM impulse train
+    elif kind == 'mix':
+        signal = (synthesize('tones', seconds, sample_rate, seed) * 0.5
+                  + synthesize('noise', seconds, sample_rate, seed) * 0.3
+                  + synthesize('clicks', seconds, sample_rate, seed) * 0.5)
+    else:
+        raise ValueError(f"Unknown fixture kind: {kind}")
+    return np.clip(signal, -1.0, 1.0).astype(np.float32)
+
+
+def make_fixtures(fixture_dir, kinds=FIXTURE_KINDS, durations=DEFAULT_DURATIONS,
+                  formats=DEFAULT_FORMATS):
+    """Write every kind/duration/format combination once; returns their paths"""
+    from stem_encoder import open_stem_writer, stem_filename
+    os.makedirs(fixture_dir, exist_ok=True)
+    paths = []
+    for kind in kinds:
+        for seconds in durations:
+            for output_format in formats:
+                path = os.path.join(fixture_dir, stem_filename(f"{kind}_{seconds}s", output_format))
+                if not os.path.exists(path):
+                    writer = open_stem_writer(path, output_format)
+                    try:
+                        writer.write(synthesize(kind, seconds))
+                    finally:
+                        writer.close()
+                paths.append(path)
+    return paths
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+def _peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        return peak / 1024.0 if sys.platform != 'darwin' else peak / 1048576.0
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / 1048576.0
+        except Exception:
+            return None
+
+
+def _run_case(input_path, stems, output_format, output_dir):
+    """Runs in a fresh process so model construction and peak RSS are cold"""
+    import spleeter_utils
+
+    timings = {}
+    # The audio adapter pulls in TensorFlow on first use; time that on its
+    # own (not compared) so decode_s measures decoding only
+    start = time.perf_counter()
+    spleeter_utils.get_audio_adapter()
+    timings['import_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    waveform = spleeter_utils.load_waveform(input_path)
+    timings['decode_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    spleeter_utils.warm_up_models(stems, background=False)
+    timings['model_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    prediction = spleeter_utils.separate_waveform(waveform, stems)
+    timings['inference_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    written = spleeter_utils.save_stems(prediction, output_dir, output_format=output_format)
+    timings['save_s'] = time.perf_counter() - start
+
+    timings['output_mb'] = sum(os.path.getsize(os.path.join(output_dir, name))
+                               for name in written) / 1048576.0
+    timings['audio_s'] = len(waveform) / float(spleeter_utils.SAMPLE_RATE)
+    timings['peak_rss_mb'] = _peak_rss_mb()
+    return timings
+
+
+def run_benchmarks(fixtures, stems_list=DEFAULT_STEMS, output_format='wav', work_dir=None):
+    context = multiprocessing.get_context('spawn')
+    work_dir = work_dir or tempfile.mkdtemp(prefix='karaoke_bench_')
+    results = []
+    for path in fixtures:
+        for stems in stems_list:
+            case = f"{os.path.basename(path)}:{stems}stems"
+            output_dir = os.path.join(work_dir, case.replace(':', '_'))
+            shutil.rmtree(output_dir, ignore_errors=True)
+            os.makedirs(output_dir)
+            print(f"⏱️  {case} ...", flush=True)
+            with context.Pool(1) as pool:
+                timings = pool.apply(_run_case, (path, stems, output_format, output_dir))
+            timings['total_s'] = (timings['decode_s'] + timings['model_s']
+                                  + timings['inference_s'] + timings['save_s'])
+            timings['rtf'] = ((timings['total_s'] - timings['model_s']) / timings['audio_s']
+                              if timings['audio_s'] else None)
+            results.append(dict(case=case, fixture=os.path.basename(path), stems=stems,
+                                output_format=output_format, **timings))
+            print(f"   total {timings['total_s']:.2f}s (+{timings['import_s']:.2f}s imports), "
+                  f"RTF {timings['rtf']:.3f}, peak RSS {timings['peak_rss_mb'] or 0:.0f} MB", flush=True)
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'results': results,
+    }
+
+# =============================================================================
+# REGRESSION COMPARISON
+# =============================================================================
+def compare(current, baseline, threshold=0.10):
+    """
+    Flag every metric that got worse than the baseline by more than
+    `threshold` (a fraction). Returns a list of regression dicts.
+    """
+    baseline_cases = {r['case']: r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        base = baseline_cases.get(result['case'])
+        if not base:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append({'case': result['case'], 'metric': metric,
+                                    'baseline': old, 'current': new, 'change': change})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark separate_music on synthetic audio")
+    parser.add_argument('-o', '--output', default='benchmark_results.json',
+                        help="Where to write the JSON results")
+    parser.add_argument('--fixtures', default=os.path.join(tempfile.gettempdir(), 'karaoke_bench_fixtures'),
+                        help="Folder for the generated test audio")
+    parser.add_argument('--kinds', default=','.join(FIXTURE_KINDS))
+    parser.add_argument('--durations', default=','.join(str(d) for d in DEFAULT_DURATIONS),
+                        help="Comma-separated fixture durations in seconds")
+    parser.add_argument('--formats', default=','.join(DEFAULT_FORMATS),
+                        help="Comma-separated fixture formats")
+    parser.add_argument('--stems', default=','.join(str(s) for s in DEFAULT_STEMS))
+    parser.add_argument('--output-format', default='wav', help="Format the stems are saved in")
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help="Compare against a saved results file and flag regressions")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Allowed slowdown before a metric counts as a regression")
+    args = parser.parse_args(argv)
+
+    fixtures = make_fixtures(args.fixtures, args.kinds.split(','),
+                             [float(d) if '.' in d else int(d) for d in args.durations.split(',')],
+                             args.formats.split(','))
+    results = run_benchmarks(fixtures, [int(s) for s in args.stems.split(',')],
+                             output_format=args.output_format)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"❌ {r['case']} {r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f} "
+                  f"(+{r['change']:.0%})")
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,435 @@
+import os
+import re
+import time
+import shutil
+import tempfile
+import threading
+import logging
+import http.client
+from urllib.parse import urlsplit, urljoin
+
+from file_watcher import wait_for_file
+
+DEFAULT_BACKEND = os.environ.get('KARAOKE_DOWNLOAD_BACKEND', 'yt-dlp')
+USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadError(Exception):
+    """Raised when a backend gives up on a download"""
+
+
+def safe_filename(name, default='download'):
+    """Turn a title into a file name that is valid on every platform"""
+    name = re.sub(r'[<>:"/\\|?*\x00-\x1f]', '', name).strip().rstrip('.')
+    return name[:150] or default
+
+# =============================================================================
+# HTTP STREAMING
+# =============================================================================
+class HttpStreamer:
+    """
+    Streams HTTP(S) resources straight to disk over pooled keep-alive
+    connections, resuming with Range requests and backing off between
+    retries.
+    """
+
+    def __init__(self, timeout=30, retries=3, backoff=1.0, chunk_size=256 * 1024,
+                 max_redirects=5):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.max_redirects = max_redirects
+        self._pool = {}
+        self._lock = threading.Lock()
+
+    def _connection(self, scheme, netloc):
+        with self._lock:
+            conn = self._pool.pop((scheme, netloc), None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            conn = cls(netloc, timeout=self.timeout)
+        return conn
+
+    def _release(self, scheme, netloc, conn):
+        with self._lock:
+            old = self._pool.get((scheme, netloc))
+            self._pool[(scheme, netloc)] = conn
+        if old is not None and old is not conn:
+            old.close()
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, {}
+        for conn in pool.values():
+            conn.close()
+
+    def _open(self, url, headers):
+        """
+        Send a GET, following redirects.
+        Returns (scheme, netloc, conn, response, final_url).
+        """
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise DownloadError(f"Unsupported URL scheme: {parts.scheme}")
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            conn = self._connection(parts.scheme, parts.netloc)
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                raise
+            if response.status in (301, 302, 303, 307, 308):
+                location = response.getheader('Location')
+                response.read()
+                self._release(parts.scheme, parts.netloc, conn)
+                if not location:
+                    raise DownloadError(f"Redirect without Location from {url}")
+                url = urljoin(url, location)
+                continue
+            return parts.scheme, parts.netloc, conn, response, url
+        raise DownloadError(f"Too many redirects for {url}")
+
+    def fetch(self, url, dest_path, progress_callback=None, headers=None):
+        """
+        Download `url` to `dest_path` via a `.part` file. `progress_callback`
+        receives (bytes_done, bytes_total or None) as data arrives; anything
+        it raises (e.g. a cancellation) aborts the download.
+
+        `dest_path` may also be a callable `(final_url, response) -> path`,
+        called on the first response to name the file after redirects.
+        """
+        name_file = dest_path if callable(dest_path) else None
+        part_path = None if name_file else dest_path + '.part'
+        last_error = None
+        for attempt in range(self.retries):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1))
+                logger.info(f"Retrying download in {delay:.1f}s ({last_error})")
+                time.sleep(delay)
+
+            offset = os.path.getsize(part_path) if part_path and os.path.exists(part_path) else 0
+            request_headers = {'User-Agent': USER_AGENT, 'Accept-Encoding': 'identity'}
+            request_headers.update(headers or {})
+            if offset:
+                request_headers['Range'] = f'bytes={offset}-'
+
+            conn = None
+            try:
+                scheme, netloc, conn, response, final_url = self._open(url, request_headers)
+                if part_path is None and response.status in (200, 206):
+                    dest_path = name_file(final_url, response)
+                    part_path = dest_path + '.part'
+                if response.status == 416 and offset:
+                    # Range not satisfiable: the part file is already complete
+                    response.read()
+                    self._release(scheme, netloc, conn)
+                    break
+                if response.status not in (200, 206):
+                    response.read()
+                    raise DownloadError(f"HTTP {response.status} for {url}")
+                if response.status == 200:
+                    offset = 0
+                length = response.getheader('Content-Length')
+                total = offset + int(length) if length else None
+
+                done = offset
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    while True:
+                        block = response.read(self.chunk_size)
+                        if not block:
+                            break
+                        f.write(block)
+                        done += len(block)
+                        if progress_callback:
+                            progress_callback(done, total)
+                if total is not None and done < total:
+                    raise http.client.IncompleteRead(b'', total - done)
+                self._release(scheme, netloc, conn)
+                break
+            except (OSError, http.client.HTTPException, DownloadError) as e:
+                if conn is not None:
+                    conn.close()
+                last_error = e
+                logger.warning(f"Download attempt {attempt + 1}/{self.retries} failed: {str(e)}")
+            except BaseException:
+                # e.g. the progress callback cancelling: never pool a half-read connection
+                if conn is not None:
+                    conn.close()
+                raise
+        else:
+            raise DownloadError(f"Download failed after {self.retries} attempts: {last_error}")
+
+        os.replace(part_path, dest_path)
+        return dest_path
+
+# =============================================================================
+# DOWNLOAD BACKENDS
+# =============================================================================
+class DownloadBackend:
+    """
+    Interface for download backends. `download` saves the audio of `url`
+    into `dest_dir` and returns the path of the finished file.
+    """
+
+    name = None
+
+    def download(self, url, dest_dir, progress_callback=None, status_callback=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HttpBackend(DownloadBackend):
+    """Downloads a direct audio URL in-process"""
+
+    name = 'http'
+
+    def __init__(self, streamer=None):
+        self.streamer = streamer or HttpStreamer()
+
+    def download(self, url, dest_dir, progress_callback=None, status_callback=None):
+        def name_file(final_url, response):
+            # Content-Disposition first, else the URL the redirects ended at
+            name = response.msg.get_filename() or os.path.basename(urlsplit(final_url).path)
+            return os.path.join(dest_dir, safe_filename(name))
+        return self.streamer.fetch(url, name_file, progress_callback=progress_callback)
+
+    def close(self):
+        self.streamer.close()
+
+
+class YtDlpBackend(DownloadBackend):
+    """
+    Resolves the best audio-only stream with yt-dlp and streams it straight
+    to disk in-process, keeping the original container (no transcoding)
+    """
+
+    name = 'yt-dlp'
+
+    def __init__(self, streamer=None):
+        self.streamer = streamer or HttpStreamer()
+        self._ydl = None
+        # YoutubeDL is not thread-safe; download workers share one instance
+        # for resolving only, which is quick next to the download itself
+        self._ydl_lock = threading.Lock()
+
+    def _resolve(self, url):
+        with self._ydl_lock:
+            if self._ydl is None:
+                import yt_dlp
+                self._ydl = yt_dlp.YoutubeDL({
+                    'quiet': True,
+                    'no_warnings': True,
+                    'noplaylist': True,
+                    'format': 'bestaudio/best',
+                })
+            try:
+                return self._ydl.extract_info(url, download=False)
+            except Exception as e:
+                raise DownloadError(f"Could not resolve {url}: {str(e)}")
+
+    def download(self, url, dest_dir, progress_callback=None, status_callback=None):
+        if status_callback:
+            status_callback("🔎 Resolving audio stream...")
+        info = self._resolve(url)
+        ext = info.get('ext') or 'm4a'
+        dest_path = os.path.join(dest_dir, f"{safe_filename(info.get('title') or info.get('id'))}.{ext}")
+
+        protocol = info.get('protocol', 'https')
+        if protocol in ('http', 'https') and info.get('url'):
+            if status_callback:
+                status_callback("📥 Download started...")
+            logger.info(f"Streaming {info.get('format_id')} ({ext}) to {dest_path}")
+            return self.streamer.fetch(info['url'], dest_path, progress_callback=progress_callback,
+                                       headers=info.get('http_headers'))
+
+        # Fragmented streams (DASH/HLS) need yt-dlp's own downloader
+        return self._download_with_ytdlp(info, dest_path, progress_callback)
+
+    def _download_with_ytdlp(self, info, dest_path, progress_callback):
+        import yt_dlp
+
+        def hook(status):
+            if progress_callback and status.get('status') == 'downloading':
+                progress_callback(status.get('downloaded_bytes', 0),
+                                  status.get('total_bytes') or status.get('total_bytes_estimate'))
+
+        opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'format': info.get('format_id') or 'bestaudio/best',
+            'outtmpl': os.path.splitext(dest_path)[0] + '.%(ext)s',
+            'progress_hooks': [hook],
+            'retries': self.streamer.retries,
+        }
+        try:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                ydl.process_ie_result(info, download=True)
+        except Exception as e:
+            raise DownloadError(f"yt-dlp download failed: {str(e)}")
+        return dest_path
+
+    def close(self):
+        self.streamer.close()
+        if self._ydl is not None:
+            self._ydl.close()
+            self._ydl = None
+
+
+class Y2mateBrowserBackend(DownloadBackend):
+    """Legacy backend driving y2mate through a headless Chrome"""
+
+    name = 'y2mate'
+    url_y2mate = "https://y2mate.as/en-qOwq/"
+
+    def download(self, url, dest_dir, progress_callback=None, status_callback=None):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        status_callback = status_callback or (lambda msg: None)
+
+        # Configure Chrome options
+        chrome_options = Options()
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--disable-gpu")
+        chrome_options.add_argument("--no-sandbox")
+        chrome_options.add_argument("--disable-dev-shm-usage")
+        chrome_options.add_argument(f"--window-size=1280,720")
+        chrome_options.add_experimental_option("prefs", {
+            "download.default_directory": dest_dir,
+            "download.prompt_for_download": False,
+            "download.directory_upgrade": True,
+            "safebrowsing.enabled": True
+        })
+
+        for attempt in range(3):
+            status_callback(f"⚙️ Attempt {attempt+1}/3...")
+            logger.info(f"Download attempt {attempt+1}/3")
+            try:
+                # Initialize WebDriver
+                driver = webdriver.Chrome(options=chrome_options)
+                logger.debug("Chrome WebDriver initialized")
+                driver.get(self.url_y2mate)
+
+                # Enter video URL
+                input_box = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, '//*[@id="v"]'))
+                )
+                input_box.send_keys(url)
+                time.sleep(1)
+                logger.debug("URL entered")
+
+                # Click Convert button
+                convert_btn = driver.find_element(By.XPATH, '/html/body/form/div[2]/button[2]')
+                convert_btn.click()
+                logger.debug("Convert button clicked")
+
+                # Wait for Download button
+                try:
+                    download_btn = WebDriverWait(driver, 20).until(
+                        EC.visibility_of_element_located((By.XPATH, '/html/body/form/div[2]/button[1]'))
+                    )
+                    logger.debug("Download button found")
+                except:
+                    status_callback("❌ Download button not found. Retrying...")
+                    logger.warning("Download button not found")
+                    driver.quit()
+                    continue
+
+                # Click Download
+                download_btn.click()
+                status_callback("📥 Download started...")
+                logger.debug("Download button clicked")
+
+                # Wait for the file to be finalized in this job's own directory
+                downloaded_file = wait_for_file(dest_dir, ('.mp3',), timeout=300)
+
+                driver.quit()
+                if not downloaded_file:
+                    status_callback("❌ Download failed or timed out.")
+                    logger.error("Download failed or timed out")
+                    continue
+                logger.debug(f"Download complete: {downloaded_file}")
+                return downloaded_file
+
+            except Exception as e:
+                logger.error(f"Download error: {str(e)}", exc_info=True)
+                status_callback(f"❌ Error: {str(e)}"[:200])
+                if 'driver' in locals():
+                    try:
+                        driver.quit()
+                    except:
+                        pass
+                continue
+
+        raise DownloadError("All 3 attempts failed. Please try again later.")
+
+
+BACKENDS = {
+    YtDlpBackend.name: YtDlpBackend,
+    HttpBackend.name: HttpBackend,
+    Y2mateBrowserBackend.name: Y2mateBrowserBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """Shared instance of the named backend, so HTTP connections are reused"""
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown download backend: {name}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+def _unique_path(directory, filename, suffix):
+    """`directory/<name>_<suffix><ext>` for `filename`, counted up if taken."""
+    name, ext = os.path.splitext(filename)
+    path = os.path.join(directory, f"{name}_{suffix}{ext}")
+    counter = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{name}_{suffix}_{counter}{ext}")
+        counter += 1
+    return path
+
+
+def download_audio(url, temp_root, final_dir, backend=None,
+                   progress_callback=None, status_callback=None):
+    """
+    Download the audio of `url` with `backend` (default: DEFAULT_BACKEND) and
+    move the finished file into `final_dir`. Returns its path.
+
+    Every call works in its own directory under `temp_root`, so concurrent
+    downloads never see each other's files or stale leftovers. The final
+    name carries that directory's suffix (`<title>_<suffix><ext>`), so two
+    songs with the same title never overwrite each other.
+    """
+    backend = backend if isinstance(backend, DownloadBackend) else get_backend(backend)
+    os.makedirs(temp_root, exist_ok=True)
+    job_dir = tempfile.mkdtemp(prefix='job_', dir=temp_root)
+    try:
+        path = backend.download(url, job_dir, progress_callback=progress_callback,
+                                status_callback=status_callback)
+        final_path = _unique_path(final_dir, os.path.basename(path),
+                                  os.path.basename(job_dir)[len('job_'):])
+        shutil.move(path, final_path)
+        logger.info(f"File moved to: {final_path}")
+        return final_path
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
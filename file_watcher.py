@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import select
+import ctypes
+import ctypes.util
+import logging
+
+TEMP_SUFFIXES = ('.crdownload', '.part', '.tmp', '.ytdl')
+
+# inotify(7) event masks
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# DIRECTORY WATCHERS
+# =============================================================================
+class InotifyWatcher:
+    """Wakes up on any create/write/rename inside one directory (Linux only)"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout):
+        """Block until something changes or `timeout` elapses; True on change"""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Portable fallback that simply sleeps for a short interval"""
+
+    def __init__(self, directory, interval=0.2):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(max(0.0, min(self.interval, timeout)))
+        return True
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory):
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            logger.debug(f"inotify unavailable, polling instead: {str(e)}")
+    return PollingWatcher(directory)
+
+# =============================================================================
+# FILE ARRIVAL
+# =============================================================================
+def _newest_finished(directory, suffixes, temp_suffixes):
+    newest = None
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            name = entry.name.lower()
+            if name.endswith(temp_suffixes) or not name.endswith(suffixes):
+                continue
+            if not entry.is_file():
+                continue
+            mtime = entry.stat().st_mtime
+            if newest is None or mtime > newest[0]:
+                newest = (mtime, entry.path)
+    return newest[1] if newest else None
+
+
+def wait_for_file(directory, suffixes, timeout=300, settle=0.5, temp_suffixes=TEMP_SUFFIXES):
+    """
+    Wait for a finished file ending in one of `suffixes` to land in
+    `directory`. In-progress downloads (`temp_suffixes`) are ignored and a
+    file only counts once its size has not changed for `settle` seconds.
+    Returns the path, or None on timeout.
+    """
+    suffixes = tuple(s.lower() for s in suffixes)
+    deadline = time.monotonic() + timeout
+    watcher = open_watcher(directory)
+    candidate = last_size = stable_since = None
+    try:
+        while True:
+            now = time.monotonic()
+            path = _newest_finished(directory, suffixes, temp_suffixes)
+            if path:
+                try:
+                    size = os.path.getsize(path)
+                except OSError:
+                    size = None
+                if path == candidate and size == last_size:
+                    if now - stable_since >= settle:
+                        logger.debug(f"File finalized: {path} ({size} bytes)")
+                        return path
+                else:
+                    candidate, last_size, stable_since = path, size, now
+
+            remaining = deadline - now
+            if remaining <= 0:
+                return None
+            if candidate:
+                # Wake up early on further writes, otherwise when it has settled
+                watcher.wait(min(remaining, stable_since + settle - now))
+            else:
+                watcher.wait(remaining)
+    finally:
+        watcher.close()
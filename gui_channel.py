@@ -0,0 +1,111 @@
+import time
+import queue
+import threading
+import logging
+
+DRAIN_INTERVAL_MS = 30
+DRAIN_BUDGET_SECONDS = 0.008   # leave the rest of each tick to Tk itself
+STATUS_INTERVAL_SECONDS = 0.1  # at most ten visible status changes per second
+
+logger = logging.getLogger(__name__)
+
+
+class GuiChannel:
+    """
+    Thread-safe route from worker threads to Tk widgets. Workers only
+    enqueue; the Tk main loop drains the queue through `root.after`,
+    spending at most DRAIN_BUDGET_SECONDS per tick.
+
+    `status` and `progress` updates are coalesced per widget and rate
+    limited, so a flood of them costs one widget update per interval.
+    The drain tick also measures how late the main loop runs it, which
+    is the latency a user feels (see `latency_stats`).
+    """
+
+    def __init__(self, root, interval_ms=DRAIN_INTERVAL_MS,
+                 status_interval=STATUS_INTERVAL_SECONDS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.status_interval = status_interval
+        self._calls = queue.SimpleQueue()
+        self._latest = {}
+        self._latest_lock = threading.Lock()
+        self._last_applied = {}
+        self._after_id = None
+        self._expected = None
+        self._lags = []
+
+    # -------------------------------------------------------------------------
+    # Any thread
+    # -------------------------------------------------------------------------
+    def post(self, callback, *args):
+        """Run `callback(*args)` on the Tk thread, in posting order"""
+        self._calls.put((callback, args))
+
+    def status(self, label, text, **options):
+        """Set `label`'s text; only the newest pending text is shown"""
+        with self._latest_lock:
+            self._latest[id(label)] = (label.config, dict(options, text=text))
+
+    def progress(self, variable, value):
+        """Set a Tk variable (e.g. a progress bar's); only the newest value counts"""
+        with self._latest_lock:
+            self._latest[id(variable)] = (variable.set, value)
+
+    # -------------------------------------------------------------------------
+    # Tk thread
+    # -------------------------------------------------------------------------
+    def start(self):
+        self._schedule()
+
+    def stop(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + self.interval_ms / 1000.0
+        self._after_id = self.root.after(self.interval_ms, self._drain)
+
+    def _drain(self):
+        start = time.perf_counter()
+        self._lags.append(max(0.0, start - self._expected))
+        if len(self._lags) > 10000:
+            del self._lags[:5000]
+
+        deadline = start + DRAIN_BUDGET_SECONDS
+        while time.perf_counter() < deadline:
+            try:
+                callback, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                logger.error(f"GUI update failed: {str(e)}", exc_info=True)
+
+        now = time.perf_counter()
+        with self._latest_lock:
+            due = {key: update for key, update in self._latest.items()
+                   if now - self._last_applied.get(key, 0.0) >= self.status_interval}
+            for key in due:
+                del self._latest[key]
+        for key, (setter, value) in due.items():
+            self._last_applied[key] = now
+            try:
+                setter(**value) if isinstance(value, dict) else setter(value)
+            except Exception as e:
+                logger.error(f"GUI update failed: {str(e)}", exc_info=True)
+        self._schedule()
+
+    def latency_stats(self):
+        """Main-loop lag of the drain ticks in milliseconds: p50, p95 and max"""
+        lags = sorted(self._lags)
+        if not lags:
+            return {'ticks': 0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'ticks': len(lags),
+            'p50_ms': lags[len(lags) // 2] * 1000.0,
+            'p95_ms': lags[int(len(lags) * 0.95)] * 1000.0,
+            'max_ms': lags[-1] * 1000.0,
+        }
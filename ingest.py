@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import shutil
+import threading
+import logging
+
+from result_cache import file_digest, remember_digest
+
+INDEX_NAME = '.ingest_index.json'
+DEFAULT_INPUT_STORE_MB = int(os.environ.get('KARAOKE_INPUT_STORE_MB', 4096))
+FICLONE = 0x40049409  # Linux ioctl: share extents with another file (btrfs, XFS, ...)
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# ZERO-COPY FILE PLACEMENT
+# =============================================================================
+def _reflink(src, dst):
+    """Copy-on-write clone of `src` at `dst`; raises OSError where unsupported"""
+    if not sys.platform.startswith('linux'):
+        raise OSError("reflinks are only attempted on Linux")
+    import fcntl
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.remove(dst)
+            raise
+
+
+def place_file(src, dst, allow_reference=False):
+    """
+    Make `src` available at `dst` as cheaply as possible: hardlink, then
+    reflink, then (with `allow_reference`) no file at all, then a copy.
+    Returns the method used: 'hardlink', 'reflink', 'reference' or 'copy'.
+    """
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError:
+        pass
+    try:
+        _reflink(src, dst)
+        return 'reflink'
+    except OSError:
+        pass
+    if allow_reference:
+        return 'reference'
+    shutil.copy2(src, dst)
+    return 'copy'
+
+# =============================================================================
+# INPUT STORE
+# =============================================================================
+class InputStore:
+    """
+    Deduplicated store of selected input files, indexed by content hash.
+    Each distinct song is placed once as `<name>_<hash prefix><ext>` (so
+    equal basenames never overwrite each other) by hardlink or reflink, or
+    referenced where it lies; re-selecting a known, unchanged file costs a
+    stat(). Files the store alone keeps alive are evicted least recently
+    used beyond `max_size_mb`.
+    """
+
+    def __init__(self, root, max_size_mb=DEFAULT_INPUT_STORE_MB):
+        self.root = root
+        self.max_size_mb = max_size_mb
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('entries', {})
+        index.setdefault('sources', {})
+        return index
+
+    def _save_index(self):
+        with open(self.index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(self.index_path + '.tmp', self.index_path)
+
+    @staticmethod
+    def _source_key(path):
+        st = os.stat(path)
+        return f"{path}|{st.st_size}|{st.st_mtime_ns}"
+
+    @staticmethod
+    def _stored_name(path, digest):
+        name, ext = os.path.splitext(os.path.basename(path))
+        return f"{name}_{digest[:12]}{ext.lower()}"
+
+    def _valid(self, entry):
+        """The entry's file still exists, unchanged"""
+        try:
+            st = os.stat(entry['path'])
+        except OSError:
+            return False
+        # Hardlinks and references change when the original is edited in place
+        return st.st_size == entry['bytes'] and st.st_mtime_ns == entry['mtime_ns']
+
+    def ingest(self, path, allow_reference=True):
+        """
+        Return the path a job should read for the file at `path`, placing
+        it in the store only when this content is not there yet
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            source_key = self._source_key(path)
+            digest = self._index['sources'].get(source_key)
+            entry = self._index['entries'].get(digest) if digest else None
+            if entry is None or not self._valid(entry):
+                digest = file_digest(path)
+                entry = self._index['entries'].get(digest)
+            if entry is not None and self._valid(entry):
+                entry['last_used'] = time.time()
+                self._index['sources'][source_key] = digest
+                self._save_index()
+                remember_digest(entry['path'], digest)
+                logger.info(f"Input already stored: {os.path.basename(path)} -> {entry['path']}")
+                return entry['path']
+
+            dst = os.path.join(self.root, self._stored_name(path, digest))
+            if os.path.exists(dst):
+                os.remove(dst)  # stale leftover with the same content hash
+            method = place_file(path, dst, allow_reference)
+            stored = path if method == 'reference' else dst
+            st = os.stat(stored)
+            self._index['entries'][digest] = {
+                'path': stored, 'method': method, 'source': path, 'bytes': st.st_size,
+                'mtime_ns': st.st_mtime_ns, 'added': time.time(), 'last_used': time.time(),
+            }
+            self._index['sources'][source_key] = digest
+            self._evict(keep=digest)
+            self._save_index()
+        remember_digest(stored, digest)
+        logger.info(f"Input {os.path.basename(path)} stored by {method}: {stored}")
+        return stored
+
+    def _owned_bytes(self, entry):
+        """Disk space that would be freed by dropping this entry"""
+        if entry['method'] == 'reference':
+            return 0
+        try:
+            st = os.stat(entry['path'])
+        except OSError:
+            return 0
+        # A hardlink whose original still exists costs nothing extra
+        return st.st_size if st.st_nlink <= 1 else 0
+
+    def _evict(self, keep=None):
+        """Drop stale entries, then owned files beyond the cap (never `keep`)"""
+        limit = self.max_size_mb * 1024 * 1024
+        entries = self._index['entries']
+        for digest in [d for d, e in entries.items() if not self._valid(e)]:
+            if entries[digest]['method'] != 'reference':
+                try:
+                    os.remove(entries[digest]['path'])
+                except OSError:
+                    pass
+            del entries[digest]
+        owned = {digest: self._owned_bytes(entry) for digest, entry in entries.items()}
+        total = sum(owned.values())
+        for digest in sorted(entries, key=lambda d: entries[d]['last_used']):
+            if total <= limit:
+                break
+            if not owned[digest] or digest == keep:
+                continue
+            try:
+                os.remove(entries[digest]['path'])
+            except OSError:
+                continue
+            total -= owned[digest]
+            logger.info(f"Evicted stored input {os.path.basename(entries[digest]['path'])}")
+            del entries[digest]
+        live = set(entries)
+        self._index['sources'] = {key: digest for key, digest in self._index['sources'].items()
+                                  if digest in live}
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._index['entries'].values())
+            methods = {}
+            for entry in entries:
+                methods[entry['method']] = methods.get(entry['method'], 0) + 1
+            return {
+                'entries': len(entries),
+                'methods': methods,
+                'owned_mb': sum(self._owned_bytes(e) for e in entries) / (1024 * 1024),
+                'max_size_mb': self.max_size_mb,
+            }
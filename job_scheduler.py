@@ -0,0 +1,466 @@
+import os
+import time
+import queue
+import itertools
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Job states, in pipeline order
+QUEUED = 'queued'
+DOWNLOADING = 'downloading'
+DECODING = 'decoding'
+SEPARATING = 'separating'
+ENCODING = 'encoding'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+STAGES = ('download', 'decode', 'separate', 'encode')
+DEFAULT_WORKERS = {'download': 2, 'decode': 1, 'separate': 1, 'encode': 2}
+STAGE_ICONS = {'decode': '🔊', 'separate': '🎧', 'save': '💾'}
+
+
+class JobCancelled(Exception):
+    """Raised inside a stage when its job has been cancelled"""
+
+
+class Job:
+    """One separation request and everything known about it so far"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, stems, url=None, input_path=None, output_dir=None, priority=0,
+                 chunk_seconds=None, output_format='wav', quality=None, keep_stems=False,
+                 only=None, preview_seconds=None, preview=None):
+        if not url and not input_path:
+            raise ValueError("A job needs either a URL or an input file")
+        self.id = next(Job._ids)
+        self.url = url
+        self.input_path = input_path
+        self.output_dir = output_dir
+        self.stems = int(stems)
+        self.priority = priority
+        self.chunk_seconds = chunk_seconds
+        self.output_format = output_format
+        self.quality = quality
+        self.keep_stems = keep_stems
+        self.only = tuple(only) if only else None
+        # A preview job separates only an excerpt; its result can be handed
+        # to a full job as `preview` so that excerpt is not separated again
+        self.preview_seconds = preview_seconds
+        self.preview = preview
+        self.preview_result = None
+        self.encode_stats = {}
+        self.progress = 0.0
+        self.eta = None
+        self.tracer = None
+        self.state = QUEUED
+        self.message = "Queued"
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.duration = None
+        self.waveform = None
+        self.prediction = None
+        self.cache_key = None
+        # Set while the job is parked waiting for a decoded-audio slot
+        self.waiting_for_slot = False
+        self._cancel_event = threading.Event()
+
+    @property
+    def name(self):
+        return os.path.basename(self.input_path) if self.input_path else self.url
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def snapshot(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'stems': self.stems,
+            'priority': self.priority,
+            'state': self.state,
+            'message': self.message,
+            'error': self.error,
+            'output_dir': self.output_dir,
+            'progress': self.progress,
+            'eta': self.eta,
+            'is_preview': bool(self.preview_seconds),
+        }
+
+
+class _Stage:
+    """A priority queue served by a bounded pool of worker threads"""
+
+    def __init__(self, name, handler, workers, scheduler):
+        self.name = name
+        self.handler = handler
+        self.scheduler = scheduler
+        self.queue = queue.PriorityQueue()
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, job):
+        self.queue.put((-job.priority, next(self.scheduler._sequence), job))
+
+    def stop(self):
+        for _ in self.threads:
+            self.queue.put((float('inf'), next(self.scheduler._sequence), None))
+
+    def _worker(self):
+        while True:
+            _, _, job = self.queue.get()
+            if job is None:
+                return
+            self.scheduler._run_stage(self, job)
+
+
+class JobScheduler:
+    """
+    Pipelines jobs through download -> decode -> separate -> encode, each
+    stage with its own bounded worker pool, so a finished download flows
+    into separation while the next URL is still downloading.
+
+    `max_decoded` bounds how many decoded waveforms may wait for the
+    separator at once, which keeps memory in check on long queues.
+    """
+
+    def __init__(self, temp_dir, input_dir, output_dir, result_cache=None,
+                 workers=None, max_decoded=2, download_backend=None):
+        self.temp_dir = temp_dir
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.result_cache = result_cache
+        self.download_backend = download_backend
+        self._jobs = {}
+        self._lock = threading.Lock()
+        # Serializes state changes, so a job never leaves a final state
+        self._state_lock = threading.RLock()
+        self._listeners = []
+        self._sequence = itertools.count()
+        self._decoded_slots = threading.BoundedSemaphore(max_decoded)
+        # Jobs waiting for a decoded slot are parked here, not on a decode
+        # worker, and re-queued one by one as slots are released
+        self._slot_lock = threading.Lock()
+        self._parked = []
+
+        workers = dict(DEFAULT_WORKERS, **(workers or {}))
+        handlers = {
+            'download': self._download,
+            'decode': self._decode,
+            'separate': self._separate,
+            'encode': self._encode,
+        }
+        self._stages = {
+            name: _Stage(name, handlers[name], workers[name], self) for name in STAGES
+        }
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+    def submit(self, job):
+        from tracing import Tracer
+        job.tracer = Tracer(lambda fraction, stage, eta: self._on_progress(job, fraction, stage, eta),
+                            label=f"job{job.id}")
+        # Queue first: a job that cannot be queued must not linger as QUEUED
+        self._stages['download' if job.url else 'decode'].put(job)
+        with self._lock:
+            self._jobs[job.id] = job
+        logger.info(f"Job {job.id} submitted: {job.name} ({job.stems} stems)")
+        self._notify(job)
+        return job
+
+    def upgrade_preview(self, job_id):
+        """
+        Submit the full separation of finished preview `job_id` with the same
+        settings and output folder, reusing the excerpt it separated
+        """
+        preview_job = self.get(job_id)
+        if preview_job is None or not preview_job.preview_seconds:
+            raise ValueError(f"Job {job_id} is not a preview")
+        if preview_job.state != DONE:
+            raise ValueError(f"Preview {job_id} has not finished yet")
+        return self.submit(Job(preview_job.stems, input_path=preview_job.input_path,
+                               output_dir=preview_job.output_dir,
+                               output_format=preview_job.output_format,
+                               quality=preview_job.quality, keep_stems=preview_job.keep_stems,
+                               only=preview_job.only, priority=preview_job.priority,
+                               preview=preview_job.preview_result))
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.state in FINAL_STATES:
+            return False
+        job._cancel_event.set()
+        with self._state_lock:
+            if job.state == QUEUED:
+                self._finish(job, CANCELLED, "Cancelled")
+        return True
+
+    def set_priority(self, job_id, priority):
+        """Takes effect from the job's next stage on"""
+        job = self.get(job_id)
+        if job is not None:
+            job.priority = priority
+            self._notify(job)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def snapshot(self):
+        return [job.snapshot() for job in self.jobs()]
+
+    def clear_finished(self):
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.state in FINAL_STATES]:
+                del self._jobs[job_id]
+
+    def add_listener(self, callback):
+        """`callback(job)` is called from worker threads on every state change"""
+        self._listeners.append(callback)
+
+    def shutdown(self):
+        for stage in self._stages.values():
+            stage.stop()
+
+    # -------------------------------------------------------------------------
+    # Stage plumbing
+    # -------------------------------------------------------------------------
+    def _notify(self, job):
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception as e:
+                logger.warning(f"Job listener failed: {str(e)}")
+
+    def _on_progress(self, job, fraction, stage, eta):
+        job.progress = fraction
+        job.eta = eta
+        if job.state not in FINAL_STATES:
+            eta_text = f", ETA {int(eta) // 60}:{int(eta) % 60:02d}" if eta is not None else ""
+            job.message = f"{STAGE_ICONS.get(stage, '⏳')} {stage.capitalize()} {fraction:.0%}{eta_text}"
+
+    def _set_state(self, job, state, message):
+        """Returns False, changing nothing, once the job is in a final state"""
+        with self._state_lock:
+            if job.state in FINAL_STATES:
+                return False
+            job.state = state
+            job.message = message
+            logger.info(f"Job {job.id}: {message}")
+            self._notify(job)
+            return True
+
+    def _finish(self, job, state, message, error=None):
+        with self._state_lock:
+            if job.state in FINAL_STATES:
+                return
+            if job.tracer is not None:
+                job.tracer.expect_done()
+            if state == DONE:
+                job.progress, job.eta = 1.0, 0.0
+            if job.waveform is not None or job.prediction is not None:
+                job.waveform = job.prediction = None
+                self._release_decode_slot()
+            job.error = error
+            job.finished = time.time()
+            self._set_state(job, state, message)
+
+    def _take_decode_slot(self, job):
+        """
+        Take a decoded-audio slot, or park `job` (cancellable, as QUEUED) and
+        return False so the decode worker can serve other jobs meanwhile
+        """
+        if self._decoded_slots.acquire(blocking=False):
+            return True
+        self._set_state(job, QUEUED, "🔊 Waiting for a decode slot...")
+        with self._slot_lock:
+            # Retry under the lock so a slot released just now is not missed
+            if self._decoded_slots.acquire(blocking=False):
+                return True
+            job.waiting_for_slot = True
+            self._parked.append((next(self._sequence), job))
+        return False
+
+    def _release_decode_slot(self):
+        """Release a slot and re-queue the highest-priority parked job"""
+        resumed = None
+        with self._slot_lock:
+            self._decoded_slots.release()
+            while self._parked and resumed is None:
+                entry = min(self._parked, key=lambda e: (-e[1].priority, e[0]))
+                self._parked.remove(entry)
+                if entry[1].state not in FINAL_STATES:
+                    resumed = entry[1]
+        if resumed is not None:
+            self._stages['decode'].put(resumed)
+
+    def _run_stage(self, stage, job):
+        if job.state in FINAL_STATES:
+            return
+        try:
+            job.check_cancelled()
+            next_stage = stage.handler(job)
+            job.check_cancelled()
+        except JobCancelled:
+            self._finish(job, CANCELLED, "Cancelled")
+            return
+        except Exception as e:
+            error_summary = str(e).split('\n')[0] or type(e).__name__
+            logger.error(f"Job {job.id} failed in {stage.name}: {str(e)}", exc_info=True)
+            self._finish(job, FAILED, f"❌ {error_summary}", error=str(e))
+            return
+        if next_stage:
+            self._stages[next_stage].put(job)
+
+    # -------------------------------------------------------------------------
+    # Stage handlers: each returns the name of the next stage, or None
+    # -------------------------------------------------------------------------
+    def _download(self, job):
+        from downloader import download_audio
+
+        def on_progress(done, total):
+            job.check_cancelled()
+            percent = f" {int(done * 100 / total)}%" if total else ""
+            job.message = f"📥 Downloading...{percent} ({done / 1048576:.1f} MB)"
+
+        self._set_state(job, DOWNLOADING, "📥 Downloading...")
+        job.check_cancelled()
+        with job.tracer.span('download', url=job.url) as span:
+            job.input_path = download_audio(job.url, self.temp_dir, self.input_dir,
+                                            backend=self.download_backend,
+                                            progress_callback=on_progress)
+            span.set(bytes=os.path.getsize(job.input_path))
+        return 'decode'
+
+    def _decode(self, job):
+        from spleeter_utils import load_waveform, plan_stems, SAMPLE_RATE
+        from tracing import realtime_factor
+
+        # Leave QUEUED before the (slow) cache check, so cancel() can no
+        # longer finish the job behind this worker's back
+        self._set_state(job, DECODING, "🔊 Waiting for a decode slot..." if job.waiting_for_slot
+                        else "🔍 Checking cache...")
+        job.check_cancelled()
+        if not job.waiting_for_slot:
+            next_stage = self._check_before_decode(job)
+            if next_stage != 'decode':
+                return next_stage
+        if not self._take_decode_slot(job):
+            return None
+        job.waiting_for_slot = False
+        try:
+            self._set_state(job, DECODING, "🔊 Decoding...")
+            job.check_cancelled()
+            with job.tracer.span('decode', bytes=os.path.getsize(job.input_path)) as span:
+                job.waveform = load_waveform(job.input_path)
+                span.set(samples=len(job.waveform))
+            audio_seconds = len(job.waveform) / SAMPLE_RATE
+            if job.preview_seconds:
+                audio_seconds = min(audio_seconds, job.preview_seconds)
+            job.tracer.progress(0.1, 'decode', eta_seconds=realtime_factor(
+                'separate', plan_stems(job.stems, job.only)[0]) * audio_seconds)
+        except BaseException:
+            job.waveform = None
+            self._release_decode_slot()
+            raise
+        if len(job.waveform) < SAMPLE_RATE:
+            raise ValueError("Audio too short (download failed?)")
+        return 'separate'
+
+    def _check_before_decode(self, job):
+        """
+        Result cache lookup and header checks, done before a decoded slot is
+        taken. Returns the next stage: 'decode' to go on decoding, 'separate'
+        for streaming jobs, or None when the cache already finished the job.
+        """
+        from spleeter_utils import probe_duration, plan_stems, DEFAULT_SILENCE_MODE
+
+        if not job.output_dir:
+            job.output_dir = os.path.join(self.output_dir, f"output_{int(time.time())}_{job.id}")
+        os.makedirs(job.output_dir, exist_ok=True)
+
+        if self.result_cache is not None and not job.preview_seconds:
+            model_stems, outputs = plan_stems(job.stems, job.only)
+            job.cache_key = self.result_cache.key(job.input_path, model_stems,
+                                                  format=job.output_format, quality=job.quality,
+                                                  outputs=outputs, silence=DEFAULT_SILENCE_MODE)
+            if self.result_cache.fetch(job.cache_key, job.output_dir):
+                job.check_cancelled()
+                self._finish(job, DONE, "✅ Done (from cache)")
+                return None
+
+        job.duration = probe_duration(job.input_path)
+        if job.duration is not None and job.duration < 1.0:
+            raise ValueError("Audio too short (download failed?)")
+        if job.chunk_seconds and not job.preview_seconds:
+            # Streaming jobs decode window by window inside the separate stage
+            return 'separate'
+        return 'decode'
+
+    def _separate(self, job):
+        from spleeter_utils import (separate_waveform, separate_music, separate_preview,
+                                    plan_stems, select_outputs)
+
+        if job.preview_seconds:
+            self._set_state(job, SEPARATING, "👁 Previewing...")
+            job.preview_result = separate_preview(job.input_path, job.output_dir, stems=job.stems,
+                                                  seconds=job.preview_seconds,
+                                                  output_format=job.output_format,
+                                                  quality=job.quality, only=job.only,
+                                                  waveform=job.waveform, tracer=job.tracer)
+            job.tracer.progress(1.0, 'done', 0.0)
+            self._finish(job, DONE, "✅ Preview ready")
+            return None
+        self._set_state(job, SEPARATING, "🎧 Separating...")
+        if job.chunk_seconds:
+            separate_music(job.input_path, job.output_dir, stems=job.stems,
+                           chunk_seconds=job.chunk_seconds, result_cache=self.result_cache,
+                           output_format=job.output_format, quality=job.quality,
+                           keep_stems=job.keep_stems, only=job.only, tracer=job.tracer,
+                           preview=job.preview)
+            job.preview = None
+            self._finish(job, DONE, "✅ Done")
+            return None
+        model_stems, outputs = plan_stems(job.stems, job.only)
+        job.prediction = select_outputs(separate_waveform(job.waveform, model_stems, job.tracer,
+                                                          preview=job.preview), outputs)
+        job.waveform = job.preview = None
+        return 'encode'
+
+    def _encode(self, job):
+        from spleeter_utils import save_stems
+
+        self._set_state(job, ENCODING, "💾 Saving stems...")
+        if job.keep_stems:
+            from remix import StemStore
+            StemStore(job.output_dir).write_prediction(job.prediction)
+        written = save_stems(job.prediction, job.output_dir, output_format=job.output_format,
+                             quality=job.quality, stats=job.encode_stats, tracer=job.tracer)
+        if self.result_cache is not None:
+            try:
+                self.result_cache.store(job.cache_key, job.output_dir, written,
+                                        source=job.input_path)
+            except Exception as e:
+                logger.warning(f"Could not store result in cache: {str(e)}")
+        job.tracer.progress(1.0, 'done', 0.0)
+        self._finish(job, DONE, "✅ Done")
+        return None
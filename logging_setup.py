@@ -0,0 +1,62 @@
+import os
+import atexit
+import queue
+import logging
+import logging.handlers
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUPS = 3
+
+_listener = None
+
+
+def configure_logging(path, level=logging.DEBUG, rotate=False, max_bytes=DEFAULT_MAX_BYTES,
+                      backups=DEFAULT_BACKUPS, fmt=DEFAULT_FORMAT):
+    """
+    Send the root logger's records through a queue to a file written by a
+    background thread, so logging never blocks the caller on disk I/O.
+
+    By default the file is appended to, which is safe for the many worker
+    processes that share a library log. Only a single-process entry point
+    (the GUI) should pass `rotate=True`: each run then starts a fresh file,
+    keeping `backups` earlier ones, and rolls over past `max_bytes`.
+    Like logging.basicConfig, does nothing if the root logger already has
+    handlers. Returns the QueueListener (or None).
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+    if rotate:
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes,
+                                                            backupCount=backups,
+                                                            encoding='utf-8', delay=True)
+        try:
+            if os.path.getsize(path) > 0:
+                file_handler.doRollover()
+        except OSError:
+            pass
+    else:
+        file_handler = logging.FileHandler(path, mode='a', encoding='utf-8', delay=True)
+    file_handler.setFormatter(logging.Formatter(fmt))
+
+    records = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(records, file_handler,
+                                               respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
@@ -1,28 +1,54 @@
+import time
+_STARTUP_T0 = time.perf_counter()  # Taken first so the import cost is measured too
+
 import sys
 import os
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, ttk
 import threading
 import subprocess
-import time
-import shutil
 import logging
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from spleeter_utils import separate_music
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='app_debug.log',
-    filemode='w'
-)
+from logging_setup import configure_logging
+from gui_channel import GuiChannel
+from result_cache import ResultCache
+from ingest import InputStore
+import tracing
+import thread_tuner
+from job_scheduler import Job, JobScheduler, QUEUED, DONE, FAILED, CANCELLED, FINAL_STATES
+
+# The downloader backends (yt-dlp, selenium) and spleeter_utils (TensorFlow)
+# are imported lazily by the features that need them, so they stay off the
+# path to the first window.
+
+# =============================================================================
+# STARTUP TIMING
+# =============================================================================
+STARTUP_TIMINGS = {}
+
+
+def _record_startup(stage, since):
+    """Record the time spent in `stage` since `since` and return now"""
+    now = time.perf_counter()
+    STARTUP_TIMINGS[stage] = now - since
+    return now
+
+
+def startup_report():
+    lines = ["===== STARTUP TIMING ====="]
+    for stage, seconds in STARTUP_TIMINGS.items():
+        lines.append(f"{stage:<22}{seconds * 1000:8.1f} ms")
+    return "\n".join(lines)
+
+
+_startup_mark = _record_startup("imports", _STARTUP_T0)
+
+# Configure logging: records are queued and written by a background thread,
+# and the previous runs' logs are kept as app_debug.log.1, .2, ...
+configure_logging('app_debug.log', rotate=True)
 logger = logging.getLogger()
 
+_startup_mark = _record_startup("logging setup", _startup_mark)
+
 # =============================================================================
 # PATH SANITIZATION AND SECURITY
 # =============================================================================
@@ -81,19 +107,18 @@ os.environ['PATH'] = os.path.join(RESOURCE_DIR, 'ffmpeg') + os.pathsep + os.envi
 logger.debug(f"SPLEETER_MODEL_PATH set to: {os.environ['SPLEETER_MODEL_PATH']}")
 logger.debug(f"FFmpeg added to PATH: {os.path.join(RESOURCE_DIR, 'ffmpeg')}")
 
-# Verify FFmpeg
-try:
+_startup_mark = _record_startup("environment setup", _startup_mark)
+
+def check_ffmpeg():
+    """Return the FFmpeg version line, or raise if FFmpeg cannot be run"""
     result = subprocess.check_output(
         ['ffmpeg', '-version'],
         stderr=subprocess.STDOUT,
-        creationflags=subprocess.CREATE_NO_WINDOW
+        creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)
     )
     ffmpeg_version = result.decode().split('\n')[0]
     logger.info(f"FFmpeg found: {ffmpeg_version}")
-except Exception as e:
-    logger.critical(f"FFmpeg ERROR: {str(e)}")
-    messagebox.showerror("FFmpeg Missing", "FFmpeg not found! Application cannot function.")
-    sys.exit(1)
+    return ffmpeg_version
 
 # =============================================================================
 # APPLICATION CONFIGURATION
@@ -101,19 +126,47 @@ except Exception as e:
 INPUT_DIR = sanitize_path(os.path.join(BASE_DIR, "input"))
 OUTPUT_DIR = sanitize_path(os.path.join(BASE_DIR, "output"))
 TEMP_DIR = sanitize_path(os.path.join(INPUT_DIR, "temp_download"))
+CACHE_DIR = sanitize_path(os.path.join(BASE_DIR, "cache"))
 
 # Create directories if missing
 os.makedirs(INPUT_DIR, exist_ok=True)
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(TEMP_DIR, exist_ok=True)
+os.makedirs(CACHE_DIR, exist_ok=True)
 logger.debug(f"Input directory: {INPUT_DIR}")
 logger.debug(f"Output directory: {OUTPUT_DIR}")
 logger.debug(f"Temp directory: {TEMP_DIR}")
+logger.debug(f"Cache directory: {CACHE_DIR}")
+_startup_mark = _record_startup("directory creation", _startup_mark)
+
+RESULT_CACHE = ResultCache(os.path.join(CACHE_DIR, "results"))
+# Selected local files are deduplicated by content and linked, not copied
+INPUT_STORE = InputStore(INPUT_DIR)
+PCM_CACHE_DIR = os.path.join(CACHE_DIR, "pcm")
+
+# Structured per-stage spans, and this machine's measured speed for ETAs
+tracing.configure(metrics_path=os.path.join(BASE_DIR, "separation_metrics.jsonl"),
+                  rtf_path=os.path.join(CACHE_DIR, "realtime_factors.json"))
+# TensorFlow thread counts calibrated with `python thread_tuner.py`
+thread_tuner.configure(os.path.join(CACHE_DIR, "thread_profiles.json"))
 
 selected_file = None
 
+# Length of the excerpt separated by the Preview button
+PREVIEW_SECONDS = 20.0
+# Must match spleeter_utils.PREVIEW_DIR (not imported here to keep startup fast)
+PREVIEW_DIR = "preview"
+
+# Output subsets offered in the GUI (None = every stem of the chosen model)
+OUTPUT_CHOICES = {
+    "All stems": None,
+    "Vocals only": ("vocals",),
+    "Instrumental only": ("instrumental",),
+    "Vocals + Instrumental": ("vocals", "instrumental"),
+}
+
 # =============================================================================
-# YOUTUBE DOWNLOAD FUNCTIONS
+# YOUTUBE URL HELPERS
 # =============================================================================
 def extract_video_id(url):
     """Extract YouTube video ID from various URL formats"""
@@ -124,145 +177,26 @@ def extract_video_id(url):
             return url.split("/")[-1].split("?")[0]
     return None
 
-def download_yt_mp3(url, status_callback):
-    global selected_file
-    video_id = extract_video_id(url)
-    if not video_id:
-        status_callback("❌ Invalid YouTube URL.")
-        logger.warning(f"Invalid YouTube URL: {url}")
-        return
-
-    status_callback("🔁 Starting conversion process...")
-    logger.info(f"Starting YouTube download: {url}")
-
-    # Configure Chrome options
-    chrome_options = Options()
-    chrome_options.add_argument("--headless=new")
-    chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
-    chrome_options.add_argument(f"--window-size=1280,720")
-    chrome_options.add_experimental_option("prefs", {
-        "download.default_directory": TEMP_DIR,
-        "download.prompt_for_download": False,
-        "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
-    })
-
-    # Use y2mate service
-    url_y2mate = "https://y2mate.as/en-qOwq/"
-
-    for attempt in range(3):
-        status_callback(f"⚙️ Attempt {attempt+1}/3...")
-        logger.info(f"Download attempt {attempt+1}/3")
-        try:
-            # Initialize WebDriver
-            driver = webdriver.Chrome(options=chrome_options)
-            logger.debug("Chrome WebDriver initialized")
-            driver.get(url_y2mate)
-
-            # Enter video URL
-            input_box = WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, '//*[@id="v"]'))
-            )
-            input_box.send_keys(url)
-            time.sleep(1)
-            logger.debug("URL entered")
-
-            # Click Convert button
-            convert_btn = driver.find_element(By.XPATH, '/html/body/form/div[2]/button[2]')
-            convert_btn.click()
-            logger.debug("Convert button clicked")
-
-            # Wait for Download button
-            try:
-                download_btn = WebDriverWait(driver, 20).until(
-                    EC.visibility_of_element_located((By.XPATH, '/html/body/form/div[2]/button[1]'))
-                )
-                logger.debug("Download button found")
-            except:
-                status_callback("❌ Download button not found. Retrying...")
-                logger.warning("Download button not found")
-                driver.quit()
-                continue
-
-            # Click Download
-            download_btn.click()
-            status_callback("📥 Download started...")
-            logger.debug("Download button clicked")
-
-            # Wait for download to complete
-            downloaded_file = None
-            timeout = 300  # 5 minutes
-            poll_interval = 2
-            elapsed = 0
-            
-            while elapsed < timeout:
-                time.sleep(poll_interval)
-                elapsed += poll_interval
-                
-                # Check for completed downloads
-                files = [f for f in os.listdir(TEMP_DIR) 
-                         if f.endswith(".mp3")]
-                
-                # Check for in-progress downloads
-                temp_files = [f for f in os.listdir(TEMP_DIR) 
-                             if f.endswith(".crdownload") or f.endswith(".part")]
-                
-                if files:
-                    downloaded_file = files[0]
-                    logger.debug(f"Download complete: {downloaded_file}")
-                    break
-                
-                if not temp_files:
-                    # No active downloads
-                    time.sleep(2)
-                    files = [f for f in os.listdir(TEMP_DIR) if f.endswith(".mp3")]
-                    if files:
-                        downloaded_file = files[0]
-                        logger.debug(f"Download complete (no temp files): {downloaded_file}")
-                        break
-
-            if not downloaded_file:
-                status_callback("❌ Download failed or timed out.")
-                logger.error("Download failed or timed out")
-                driver.quit()
-                continue
-
-            # Move to main input directory
-            src_path = os.path.join(TEMP_DIR, downloaded_file)
-            final_path = os.path.join(INPUT_DIR, downloaded_file)
-            shutil.move(src_path, final_path)
-            logger.info(f"File moved to: {final_path}")
-
-            selected_file = final_path
-            status_callback("✅ MP3 downloaded and ready.")
-            driver.quit()
-            return
-
-        except Exception as e:
-            import traceback
-            error_msg = f"❌ Error: {str(e)}\n{traceback.format_exc()}"
-            logger.error(f"Download error: {error_msg}")
-            status_callback(error_msg[:200])  # Show first 200 chars
-            if 'driver' in locals():
-                try:
-                    driver.quit()
-                except:
-                    pass
-            continue
-
-    status_callback("❌ All 3 attempts failed. Please try again later.")
-    logger.error("All download attempts failed")
-
 # =============================================================================
 # GUI APPLICATION
 # =============================================================================
-def run_gui():
+def service_url_from_args(argv):
+    """`--service URL` (or KARAOKE_SERVICE_URL) runs the GUI as a thin client of service.py"""
+    if '--service' in argv:
+        index = argv.index('--service')
+        if index + 1 < len(argv):
+            return argv[index + 1]
+    return os.environ.get('KARAOKE_SERVICE_URL')
+
+
+def run_gui(warm_up=True, startup_report_to_stdout=False, service_url=None):
+    gui_start = time.perf_counter()
     root = tk.Tk()
     root.title("AI Music Splitter")
-    root.geometry("440x520")
+    root.geometry("440x870")
     root.resizable(False, False)
+    # Worker threads never touch widgets; they post here and Tk applies it
+    channel = GuiChannel(root)
     
     # Set application icon
     try:
@@ -296,8 +230,8 @@ def run_gui():
     yt_entry = tk.Entry(yt_frame, width=45)
     yt_entry.pack(fill="x", pady=2)
     
-    yt_btn = tk.Button(yt_frame, text="Download MP3", 
-                      command=lambda: start_yt_download(yt_entry, status_label),
+    yt_btn = tk.Button(yt_frame, text="Download & Separate", 
+                      command=lambda: start_yt_download(yt_entry, stem_var, format_var, outputs_var, status_label),
                       bg="#e74c3c", fg="white", width=20)
     yt_btn.pack(pady=5)
 
@@ -313,12 +247,69 @@ def run_gui():
     tk.Radiobutton(stem_frame, text="5 Stems (Vocals + Drums + Bass + Piano + Other)", 
                   variable=stem_var, value="5").pack(anchor="w", padx=5)
 
-    # Separate Button
-    separate_btn = tk.Button(root, text="Separate Audio", 
-                           command=lambda: start_separation(stem_var, status_label), 
+    format_row = tk.Frame(stem_frame)
+    format_row.pack(anchor="w", padx=5, pady=(5, 0))
+    tk.Label(format_row, text="Output format:").pack(side=tk.LEFT)
+    format_var = tk.StringVar(value="wav")
+    tk.OptionMenu(format_row, format_var, "wav", "flac", "mp3", "opus").pack(side=tk.LEFT, padx=5)
+    tk.Label(format_row, text="Outputs:").pack(side=tk.LEFT, padx=(10, 0))
+    outputs_var = tk.StringVar(value="All stems")
+    tk.OptionMenu(format_row, outputs_var, *OUTPUT_CHOICES).pack(side=tk.LEFT, padx=5)
+
+
+    # Separate and Preview Buttons
+    separate_row = tk.Frame(root)
+    separate_row.pack(pady=10)
+    separate_btn = tk.Button(separate_row, text="Separate Audio", 
+                           command=lambda: start_separation(stem_var, format_var, outputs_var, status_label), 
                            bg="#27ae60", fg="white", font=("Arial", 10, "bold"),
                            height=2, width=20)
-    separate_btn.pack(pady=15)
+    separate_btn.pack(side=tk.LEFT, padx=4)
+    preview_btn = tk.Button(separate_row, text=f"Preview {int(PREVIEW_SECONDS)}s",
+                            command=lambda: start_separation(stem_var, format_var, outputs_var, status_label,
+                                                             preview_seconds=PREVIEW_SECONDS),
+                            bg="#8e44ad", fg="white", font=("Arial", 10, "bold"),
+                            height=2, width=12)
+    preview_btn.pack(side=tk.LEFT, padx=4)
+
+    # Karaoke Remix
+    remix_frame = tk.LabelFrame(root, text=" 🎤 Karaoke Remix ", padx=10, pady=5)
+    remix_frame.pack(fill="x", padx=15, pady=5)
+
+    tk.Label(remix_frame, text="Vocals level (%):").pack(side=tk.LEFT)
+    vocals_var = tk.IntVar(value=0)
+    tk.Scale(remix_frame, from_=0, to=100, orient=tk.HORIZONTAL, variable=vocals_var,
+             length=140, resolution=5).pack(side=tk.LEFT, padx=5)
+    tk.Button(remix_frame, text="Create Remix", width=12,
+              command=lambda: start_remix(vocals_var, format_var, status_label)).pack(side=tk.LEFT, padx=5)
+
+    # Job Queue
+    queue_frame = tk.LabelFrame(root, text=" 📋 Job Queue ", padx=10, pady=5)
+    queue_frame.pack(fill="both", expand=True, padx=15, pady=5)
+
+    queue_view = ttk.Treeview(queue_frame, columns=("job", "stems", "status"),
+                              show="headings", height=6)
+    queue_view.heading("job", text="Job")
+    queue_view.heading("stems", text="Stems")
+    queue_view.heading("status", text="Status")
+    queue_view.column("job", width=170)
+    queue_view.column("stems", width=45, anchor=tk.CENTER)
+    queue_view.column("status", width=160)
+    queue_view.pack(fill="both", expand=True)
+
+    progress_var = tk.DoubleVar(value=0.0)
+    ttk.Progressbar(queue_frame, variable=progress_var, maximum=100.0).pack(fill="x", pady=(3, 0))
+
+    queue_buttons = tk.Frame(queue_frame)
+    queue_buttons.pack(fill="x", pady=3)
+    tk.Button(queue_buttons, text="Cancel", width=10,
+              command=lambda: cancel_selected_jobs()).pack(side=tk.LEFT, padx=2)
+    tk.Button(queue_buttons, text="Prioritize", width=10,
+              command=lambda: prioritize_selected_jobs()).pack(side=tk.LEFT, padx=2)
+    tk.Button(queue_buttons, text="Full Run", width=8,
+              command=lambda: upgrade_selected_previews()).pack(side=tk.LEFT, padx=2)
+    tk.Button(queue_buttons, text="Clear Finished", width=12,
+              command=lambda: in_background(scheduler.clear_finished)).pack(side=tk.LEFT, padx=2)
 
     # Status Bar
     status_frame = tk.Frame(root, bd=1, relief=tk.SUNKEN)
@@ -326,9 +317,37 @@ def run_gui():
     status_label = tk.Label(status_frame, text="Ready", fg="#2c3e50", anchor=tk.W)
     status_label.pack(fill="x", padx=5, pady=2)
 
+    # Each job carries its own input, output and state; the scheduler runs
+    # downloads, decoding, separation and encoding on separate worker pools
+    if service_url:
+        # Thin client: a running service.py holds the warm models and workers
+        from service import RemoteScheduler
+        scheduler = RemoteScheduler(service_url)
+        logger.info(f"Using separation service at {service_url}")
+    else:
+        scheduler = JobScheduler(TEMP_DIR, INPUT_DIR, OUTPUT_DIR, result_cache=RESULT_CACHE)
+
     # =========================================================================
     # GUI HELPER FUNCTIONS
     # =========================================================================
+    def in_background(action, on_done=None, failure="❌"):
+        """
+        Run a scheduler call off the Tk thread (with a service it is an HTTP
+        round trip) and pass its result to `on_done` on the Tk thread.
+        Failures, e.g. an unreachable service, are shown in the status bar.
+        """
+        def worker():
+            try:
+                result = action()
+            except Exception as e:
+                summary = str(e).split('\n')[0] or type(e).__name__
+                logger.error(f"Scheduler call failed: {str(e)}")
+                channel.status(status_label, f"{failure} {summary}")
+                return
+            if on_done is not None:
+                channel.post(on_done, result)
+        threading.Thread(target=worker, daemon=True).start()
+
     def select_local_file(file_label, status_label):
         global selected_file
         file = filedialog.askopenfilename(
@@ -336,21 +355,28 @@ def run_gui():
             filetypes=[("Audio files", "*.mp3 *.wav *.flac *.ogg *.m4a")]
         )
         if file:
-            try:
-                # Copy to input directory
-                filename = os.path.basename(file)
-                dest = os.path.join(INPUT_DIR, filename)
-                shutil.copy(file, dest)
-                selected_file = dest
-                file_label.config(text=filename)
-                status_label.config(text="✅ Local file selected.")
-                logger.info(f"Local file selected: {filename}")
-            except Exception as e:
-                error_msg = f"❌ Error: {str(e)}"
-                status_label.config(text=error_msg)
-                logger.error(f"File copy error: {str(e)}")
+            # Hashing a large file takes a moment, so keep it off the Tk thread
+            status_label.config(text="⏳ Importing file...")
+            threading.Thread(target=threaded_ingest, args=(file, file_label, status_label),
+                             daemon=True).start()
+
+    def threaded_ingest(file, file_label, status_label):
+        try:
+            stored = INPUT_STORE.ingest(file)
+        except Exception as e:
+            logger.error(f"File import error: {str(e)}")
+            channel.status(status_label, f"❌ Error: {str(e)}")
+            return
+        channel.post(file_selected, stored, os.path.basename(file), file_label, status_label)
+
+    def file_selected(stored, filename, file_label, status_label):
+        global selected_file
+        selected_file = stored
+        file_label.config(text=filename)
+        status_label.config(text="✅ Local file selected.")
+        logger.info(f"Local file selected: {filename} ({stored})")
 
-    def start_separation(stem_var, status_label):
+    def start_separation(stem_var, format_var, outputs_var, status_label, preview_seconds=None):
         if not selected_file:
             messagebox.showerror("No file", "Please select or download an audio file.")
             return
@@ -370,67 +396,209 @@ def run_gui():
             logger.warning(error_msg)
             return
             
-        # Validate audio duration
-        try:
-            from pydub import AudioSegment
-            audio = AudioSegment.from_file(selected_file)
-            if len(audio) < 1000:  # Less than 1 second
-                error_msg = "❌ Audio too short (download failed?)"
-                status_label.config(text=error_msg)
-                logger.warning(error_msg)
-                return
-        except Exception as e:
-            logger.warning(f"Audio duration check skipped: {str(e)}")
-            
-        threading.Thread(target=threaded_separation, args=(stem_var, status_label)).start()
+        # Too-short audio is reported by the decode stage, off the Tk thread
+        if preview_seconds:
+            # Previews jump the queue; the model is usually already warm
+            job = Job(int(stem_var.get()), input_path=selected_file,
+                      output_format=format_var.get(), keep_stems=True,
+                      only=OUTPUT_CHOICES[outputs_var.get()],
+                      priority=top_priority() + 1, preview_seconds=preview_seconds)
+            in_background(lambda: scheduler.submit(job), lambda job: status_label.config(
+                text=f"👁 Preview {job.id} queued: {job.name}"))
+            return
+        job = Job(int(stem_var.get()), input_path=selected_file,
+                  output_format=format_var.get(), keep_stems=True,
+                  only=OUTPUT_CHOICES[outputs_var.get()])
+        in_background(lambda: scheduler.submit(job), lambda job: status_label.config(
+            text=f"🎧 Job {job.id} queued: {job.name}"))
 
-    def threaded_separation(stem_var, status_label):
-        try:
-            selected_stems = int(stem_var.get())
-            status_text = "🎧 Starting audio separation..."
-            status_label.config(text=status_text)
-            logger.info(status_text)
-            
-            # Create unique output directory per separation
-            timestamp = int(time.time())
-            separation_output = sanitize_path(os.path.join(OUTPUT_DIR, f"output_{timestamp}"))
-            os.makedirs(separation_output, exist_ok=True)
-            logger.info(f"Created output directory: {separation_output}")
-            
-            # Debug info
-            logger.debug(f"Separating: {selected_file}")
-            logger.debug(f"Output dir: {separation_output}")
-            logger.debug(f"Stems: {selected_stems}")
-            
-            # Run separation
-            separate_music(selected_file, separation_output, stems=selected_stems)
-            
+    def start_yt_download(yt_entry, stem_var, format_var, outputs_var, status_label):
+        yt_url = yt_entry.get().strip()
+        if not yt_url:
+            messagebox.showerror("Missing URL", "Please enter a YouTube URL.")
+            return
+        if not extract_video_id(yt_url):
+            status_label.config(text="❌ Invalid YouTube URL.")
+            logger.warning(f"Invalid YouTube URL: {yt_url}")
+            return
+        job = Job(int(stem_var.get()), url=yt_url, output_format=format_var.get(),
+                  keep_stems=True, only=OUTPUT_CHOICES[outputs_var.get()])
+
+        def queued(job):
+            if yt_entry.get().strip() == yt_url:
+                yt_entry.delete(0, tk.END)
+            status_label.config(text=f"📥 Job {job.id} queued: {yt_url}")
+        in_background(lambda: scheduler.submit(job), queued)
+
+    def selected_job_ids():
+        return [int(item) for item in queue_view.selection()]
+
+    def top_priority():
+        """Highest priority in the last snapshot shown"""
+        return max((row['priority'] for row in queue_rows['rows']), default=0)
+
+    def cancel_selected_jobs():
+        for job_id in selected_job_ids():
+            in_background(lambda job_id=job_id: scheduler.cancel(job_id))
+
+    def prioritize_selected_jobs():
+        top = top_priority()
+        for job_id in selected_job_ids():
+            in_background(lambda job_id=job_id: scheduler.set_priority(job_id, top + 1))
+
+    def upgrade_selected_previews():
+        """Run the full separation for finished previews, reusing their excerpt"""
+        for job_id in selected_job_ids():
+            in_background(lambda job_id=job_id: scheduler.upgrade_preview(job_id),
+                          lambda job: status_label.config(
+                              text=f"🎧 Job {job.id} queued: full run of {job.name}"),
+                          failure="⏳")
+
+    announced = set()
+    last_output = {'dir': None}
+    queue_rows = {'rows': []}
+    closing = threading.Event()
+
+    def poll_queue():
+        """
+        Fetch job snapshots off the Tk thread (with a service each one is an
+        HTTP request) and hand them to refresh_queue, at most every 250 ms
+        and never faster than Tk applies them
+        """
+        applied = threading.Event()
+        while not closing.is_set():
+            try:
+                rows = scheduler.snapshot()
+            except Exception as e:
+                logger.warning(f"Could not read the job queue: {str(e)}")
+                rows = queue_rows['rows']
+            applied.clear()
+            channel.post(refresh_queue, rows, applied)
+            while not applied.wait(0.5) and not closing.is_set():
+                pass
+            closing.wait(0.25)
+
+    def refresh_queue(rows, applied):
+        """Redraw the queue view from a scheduler snapshot (runs on the Tk thread)"""
+        applied.set()
+        queue_rows['rows'] = rows
+        current = {str(row['id']) for row in rows}
+        for item in queue_view.get_children():
+            if item not in current:
+                queue_view.delete(item)
+        for row in rows:
+            item = str(row['id'])
+            values = (f"#{row['id']} {row['name']}", row['stems'], row['message'])
+            if queue_view.exists(item):
+                if tuple(str(v) for v in queue_view.item(item, "values")) != tuple(str(v) for v in values):
+                    queue_view.item(item, values=values)
+            else:
+                queue_view.insert("", tk.END, iid=item, values=values)
+            if row['state'] in FINAL_STATES and row['id'] not in announced:
+                announced.add(row['id'])
+                announce_finished(row)
+        update_progress_bar(rows)
+
+    def update_progress_bar(rows):
+        """Follow the selected job, or else the oldest job still running"""
+        selected = set(queue_view.selection())
+        tracked = [r for r in rows if str(r['id']) in selected]
+        if not tracked:
+            tracked = [r for r in rows if r['state'] not in FINAL_STATES and r['state'] != QUEUED]
+        progress_var.set(tracked[0]['progress'] * 100.0 if tracked else 0.0)
+
+    def announce_finished(row):
+        if row['state'] == DONE and row['is_preview']:
+            preview_dir = os.path.join(row['output_dir'], PREVIEW_DIR)
+            status_label.config(text=f"👁 Preview {row['id']} ready - select it and press Full Run")
+            messagebox.showinfo("Preview Ready", f"Preview stems saved to:\n{preview_dir}")
+        elif row['state'] == DONE:
+            last_output['dir'] = row['output_dir']
             status_text = "✅ Separation completed successfully!"
             status_label.config(text=status_text)
             logger.info(status_text)
-            messagebox.showinfo("Success", f"Output saved to:\n{separation_output}")
-        except Exception as e:
-            # Extract first line of error
-            error_lines = str(e).split('\n')
-            error_summary = error_lines[0] if error_lines else "Unknown error"
-            
-            status_text = f"❌ {error_summary}"
-            status_label.config(text=status_text)
-            logger.error(f"Separation failed: {str(e)}")
+            messagebox.showinfo("Success", f"Output saved to:\n{row['output_dir']}")
+        elif row['state'] == FAILED:
+            error_lines = (row['error'] or "").split('\n')
+            error_summary = error_lines[0] if error_lines[0] else "Unknown error"
+            status_label.config(text=f"❌ {error_summary}")
             messagebox.showerror("Separation Failed", error_summary)
             
             # Write full error to log
             with open("separation_errors.log", "a") as f:
-                f.write(f"[{time.ctime()}] Error: {str(e)}\n\n")
+                f.write(f"[{time.ctime()}] Error: {row['error']}\n\n")
+        elif row['state'] == CANCELLED:
+            status_label.config(text=f"Job {row['id']} cancelled")
 
-    def start_yt_download(yt_entry, status_label):
-        yt_url = yt_entry.get().strip()
-        if not yt_url:
-            messagebox.showerror("Missing URL", "Please enter a YouTube URL.")
+    def start_remix(vocals_var, format_var, status_label):
+        if not last_output['dir']:
+            messagebox.showerror("No stems", "Separate a song first, then create a remix.")
             return
-        threading.Thread(target=download_yt_mp3, args=(yt_url, lambda msg: status_label.config(text=msg))).start()
+        threading.Thread(target=threaded_remix, daemon=True,
+                         args=(last_output['dir'], vocals_var.get() / 100.0, format_var.get(),
+                               status_label)).start()
 
+    def threaded_remix(output_dir, vocals_gain, output_format, status_label):
+        try:
+            from remix import remix
+            channel.status(status_label, "🎤 Creating remix...")
+            path = remix(output_dir, gains={'vocals': vocals_gain}, output_format=output_format)
+            channel.status(status_label, f"✅ Remix saved: {os.path.basename(path)}")
+        except Exception as e:
+            channel.status(status_label, f"❌ Remix failed: {str(e).splitlines()[0] if str(e) else e}")
+            logger.error(f"Remix failed: {str(e)}", exc_info=True)
+
+    # =========================================================================
+    # DEFERRED STARTUP WORK
+    # =========================================================================
+    ffmpeg_check = {}
+
+    def run_ffmpeg_check():
+        try:
+            ffmpeg_check['version'] = check_ffmpeg()
+        except Exception as e:
+            ffmpeg_check['error'] = e
+
+    def poll_ffmpeg_check(thread):
+        if thread.is_alive():
+            root.after(100, poll_ffmpeg_check, thread)
+            return
+        if 'error' in ffmpeg_check:
+            logger.critical(f"FFmpeg ERROR: {str(ffmpeg_check['error'])}")
+            messagebox.showerror("FFmpeg Missing", "FFmpeg not found! Application cannot function.")
+            root.destroy()
+
+    def on_first_paint():
+        _record_startup("first paint", gui_ready)
+        STARTUP_TIMINGS["total"] = time.perf_counter() - _STARTUP_T0
+        report = startup_report()
+        logger.info(report)
+        if startup_report_to_stdout:
+            print(report)
+
+        # Off the critical path: FFmpeg check, decode cache and model warm-up
+        thread = threading.Thread(target=run_ffmpeg_check, daemon=True)
+        thread.start()
+        poll_ffmpeg_check(thread)
+        if not service_url:
+            threading.Thread(target=prepare_separation, args=(int(stem_var.get()),),
+                             daemon=True).start()
+
+    def prepare_separation(stems):
+        from spleeter_utils import warm_up_models, configure_pcm_cache
+        configure_pcm_cache(PCM_CACHE_DIR)
+        if warm_up:
+            # Load the selected model in the background so the first separation is fast
+            warm_up_models(stems, background=False)
+
+    gui_ready = _record_startup("GUI construction", gui_start)
+    root.after(0, on_first_paint)
+    threading.Thread(target=poll_queue, daemon=True, name="queue-poll").start()
+    channel.start()
     root.mainloop()
+    closing.set()
+    logger.info(f"Main loop latency: {channel.latency_stats()}")
+    scheduler.shutdown()
 
 # =============================================================================
 # APPLICATION ENTRY POINT
@@ -445,7 +613,8 @@ if __name__ == "__main__":
     
     # Start the application
     try:
-        run_gui()
+        run_gui(startup_report_to_stdout='--startup-report' in sys.argv,
+                service_url=service_url_from_args(sys.argv))
     except Exception as e:
         logger.critical(f"Fatal error: {str(e)}", exc_info=True)
         messagebox.showerror("Fatal Error", f"Application crashed: {str(e)}")
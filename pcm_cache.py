@@ -0,0 +1,153 @@
+import os
+import threading
+import logging
+
+import numpy as np
+
+from result_cache import file_digest
+
+DEFAULT_PCM_CACHE_MB = int(os.environ.get('KARAOKE_PCM_CACHE_MB', 4096))
+CHANNELS = 2
+FRAME_BYTES = 4 * CHANNELS
+
+logger = logging.getLogger(__name__)
+
+
+def to_stereo(waveform):
+    """Mono is duplicated, extra channels are dropped (as Spleeter does)"""
+    if waveform.ndim == 1:
+        waveform = waveform[:, None]
+    if waveform.shape[1] == 1:
+        return np.repeat(waveform, 2, axis=1)
+    return waveform[:, :2]
+
+
+class _PCMWriter:
+    """Appends decoded blocks to a cache entry; nothing is visible until commit"""
+
+    def __init__(self, cache, path):
+        self.cache = cache
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}_{threading.get_ident()}.tmp"
+        self._file = open(self.tmp_path, 'wb')
+
+    def append(self, block):
+        self._file.write(np.ascontiguousarray(to_stereo(block), dtype='<f4').tobytes())
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        self.cache._evict()
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except OSError:
+            pass
+
+
+class PCMCache:
+    """
+    On-disk cache of decoded, resampled audio as raw stereo float32 files,
+    keyed by the source's content hash and the sample rate. Hits come back
+    as read-only memory maps, so repeat loads copy nothing.
+    """
+
+    def __init__(self, root, max_size_mb=DEFAULT_PCM_CACHE_MB):
+        self.root = root
+        self.max_size_mb = max_size_mb
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, input_path, sample_rate):
+        return os.path.join(self.root, f"{file_digest(input_path)}_{int(sample_rate)}.f32")
+
+    def get(self, input_path, sample_rate):
+        """Memory-mapped waveform of shape (frames, 2), or None on a miss"""
+        path = self._path(input_path, sample_rate)
+        waveform = None
+        try:
+            size = os.path.getsize(path)
+            if size >= FRAME_BYTES:
+                # Touch the entry so eviction is least-recently-used
+                os.utime(path, None)
+                waveform = np.memmap(path, dtype='<f4', mode='r',
+                                     shape=(size // FRAME_BYTES, CHANNELS))
+        except OSError:
+            # Missing, or evicted by another process since the size check
+            waveform = None
+        with self._lock:
+            if waveform is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_served += size
+        return waveform
+
+    def writer(self, input_path, sample_rate):
+        return _PCMWriter(self, self._path(input_path, sample_rate))
+
+    def put(self, input_path, sample_rate, waveform):
+        writer = self.writer(input_path, sample_rate)
+        try:
+            writer.append(waveform)
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith('.f32'):
+                path = os.path.join(self.root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Remove least recently used entries until under the size cap"""
+        limit = self.max_size_mb * 1024 * 1024
+        with self._lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    # Still memory-mapped elsewhere (Windows); try again next time
+                    continue
+                total -= size
+                logger.info(f"Evicted decoded audio {os.path.basename(path)}")
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_served': self.bytes_served,
+                'size_mb': self.size_bytes() / (1024 * 1024),
+                'max_size_mb': self.max_size_mb,
+            }
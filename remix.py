@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import shutil
+import logging
+
+import numpy as np
+
+from stem_encoder import SAMPLE_RATE, open_stem_writer, stem_filename
+
+STORE_DIR = '.stems'
+INDEX_NAME = 'index.json'
+CHANNELS = 2
+CHUNK_FRAMES = 1 << 20  # ~24 s of stereo audio per mixing step
+
+# Per-stem gains; stems that are not listed play at 1.0
+PRESETS = {
+    'instrumental': {'vocals': 0.0},
+    'guide_vocals': {'vocals': 0.25},
+}
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# MEMORY-MAPPED STEM STORE
+# =============================================================================
+class StemStore:
+    """
+    Raw float32 stereo copies of the separated stems, kept next to the
+    output as `<output_dir>/.stems/<instrument>.f32` and read back as
+    memory maps, so remixing never loads whole stems into RAM
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.root = os.path.join(output_dir, STORE_DIR)
+        self._files = {}
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, INDEX_NAME)
+
+    def exists(self):
+        return os.path.exists(self.index_path)
+
+    def _path(self, instrument):
+        return os.path.join(self.root, f"{instrument}.f32")
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+    def append(self, instrument, data):
+        """Append samples for `instrument` (used while separating)"""
+        if instrument not in self._files:
+            os.makedirs(self.root, exist_ok=True)
+            self._files[instrument] = open(self._path(instrument), 'wb')
+        self._files[instrument].write(np.ascontiguousarray(data, dtype='<f4').tobytes())
+
+    def write_prediction(self, prediction):
+        for instrument, data in prediction.items():
+            self.append(instrument, data)
+        self.close()
+
+    def close(self, sample_rate=SAMPLE_RATE):
+        """Finish writing and record the index"""
+        for f in self._files.values():
+            f.close()
+        instruments = sorted(self._files)
+        self._files = {}
+        if not instruments:
+            return
+        frames = os.path.getsize(self._path(instruments[0])) // (4 * CHANNELS)
+        index = {'sample_rate': sample_rate, 'channels': CHANNELS,
+                 'frames': frames, 'instruments': instruments}
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2)
+
+    def build_from_encoded(self):
+        """Create the store by decoding already written stem files, chunk by chunk"""
+        from spleeter_utils import stream_audio
+        names = [n for n in sorted(os.listdir(self.output_dir))
+                 if os.path.splitext(n)[1].lower() in ('.wav', '.flac', '.mp3', '.opus')
+                 and not n.startswith('remix_')]
+        if not names:
+            raise FileNotFoundError(f"No stems found in {self.output_dir}")
+        for name in names:
+            instrument = os.path.splitext(name)[0]
+            for block in stream_audio(os.path.join(self.output_dir, name), SAMPLE_RATE):
+                self.append(instrument, block)
+        self.close()
+
+    def remove(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+    def index(self):
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def open(self):
+        """Read-only memory maps of every stem, keyed by instrument"""
+        index = self.index()
+        stems = {}
+        for instrument in index['instruments']:
+            frames = os.path.getsize(self._path(instrument)) // (4 * CHANNELS)
+            stems[instrument] = np.memmap(self._path(instrument), dtype='<f4', mode='r',
+                                          shape=(frames, CHANNELS))
+        return stems
+
+
+def open_store(output_dir):
+    """The stem store for `output_dir`, built from the stem files if missing"""
+    store = StemStore(output_dir)
+    if not store.exists():
+        logger.info(f"No stem store in {output_dir}, building it from the stem files")
+        store.build_from_encoded()
+    return store
+
+# =============================================================================
+# REMIXING
+# =============================================================================
+def resolve_gains(instruments, gains=None, preset=None):
+    resolved = {instrument: 1.0 for instrument in instruments}
+    resolved.update(PRESETS.get(preset, {}) if preset else {})
+    resolved.update(gains or {})
+    unknown = set(resolved) - set(instruments)
+    if unknown:
+        logger.debug(f"Ignoring gains for missing stems: {sorted(unknown)}")
+    return {instrument: float(resolved[instrument]) for instrument in instruments}
+
+
+def mix_chunks(stems, gains, chunk_frames=CHUNK_FRAMES):
+    """Yield the gain-weighted sum of `stems` in chunks of `chunk_frames`"""
+    active = [(stems[name], gain) for name, gain in gains.items() if gain != 0.0]
+    frames = min(len(data) for data in stems.values())
+    accumulator = np.empty((min(chunk_frames, frames), CHANNELS), dtype=np.float32)
+    for start in range(0, frames, chunk_frames):
+        stop = min(start + chunk_frames, frames)
+        out = accumulator[:stop - start]
+        out.fill(0.0)
+        for data, gain in active:
+            if gain == 1.0:
+                out += data[start:stop]
+            else:
+                out += data[start:stop] * np.float32(gain)
+        np.clip(out, -1.0, 1.0, out=out)
+        yield out
+
+
+def remix(output_dir, gains=None, preset=None, name=None, output_format='wav', quality=None,
+          chunk_frames=CHUNK_FRAMES):
+    """
+    Mix the separated stems in `output_dir` with per-stem `gains` (or a
+    `preset` from PRESETS) and write the result next to them. Returns the
+    path of the new mix.
+    """
+    start = time.perf_counter()
+    store = open_store(output_dir)
+    stems = store.open()
+    gains = resolve_gains(list(stems), gains, preset)
+    name = name or 'remix_' + '_'.join(f"{k}{int(round(v * 100))}" for k, v in sorted(gains.items()))
+    output_path = os.path.join(output_dir, stem_filename(name, output_format))
+
+    writer = open_stem_writer(output_path, output_format, quality, store.index()['sample_rate'])
+    try:
+        for chunk in mix_chunks(stems, gains, chunk_frames):
+            writer.write(chunk)
+    finally:
+        writer.close()
+    logger.info(f"Remix {os.path.basename(output_path)} written in "
+                f"{time.perf_counter() - start:.2f}s with gains {gains}")
+    return output_path
@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+import logging
+
+DEFAULT_RESULT_CACHE_MB = int(os.environ.get('KARAOKE_RESULT_CACHE_MB', 4096))
+META_NAME = 'meta.json'
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# CONTENT HASHING
+# =============================================================================
+_digest_memo = {}
+_digest_lock = threading.Lock()
+
+
+def file_digest(path, block_size=1024 * 1024):
+    """
+    SHA-256 of a file's contents. Results are memoized on (path, size, mtime)
+    so re-hashing an unchanged file is free.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    memo_key = (path, st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest:
+        return digest
+
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
+
+
+def remember_digest(path, digest):
+    """Seed the memo with a digest known from elsewhere (e.g. a persisted index)"""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    with _digest_lock:
+        _digest_memo[(path, st.st_size, st.st_mtime_ns)] = digest
+
+
+def model_identity(stems):
+    """Identifier of the model that produced a result, including Spleeter's version"""
+    try:
+        from importlib.metadata import version
+        spleeter_version = version('spleeter')
+    except Exception:
+        spleeter_version = 'unknown'
+    return f"spleeter-{spleeter_version}:{stems}stems"
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+# =============================================================================
+# RESULT CACHE
+# =============================================================================
+class ResultCache:
+    """
+    Content-addressed store of finished separations. Entries are keyed by
+    the input's content hash, the stem configuration and the model identity,
+    and are materialized into output folders with hardlinks (or copies);
+    stem writers replace rather than rewrite existing files (see
+    stem_encoder.open_stem_writer), so the cache never changes through them.
+    """
+
+    def __init__(self, root, max_size_mb=DEFAULT_RESULT_CACHE_MB):
+        self.root = root
+        self.max_size_mb = max_size_mb
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, input_path, stems, **options):
+        parts = [file_digest(input_path), model_identity(stems)]
+        parts += [f"{name}={options[name]}" for name in sorted(options)]
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _read_meta(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), META_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        path = os.path.join(self._entry_dir(key), META_NAME)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def verify(self, key, deep=False):
+        """
+        Check that every cached file is present with the recorded size and
+        modification time, and with `deep=True` also the recorded SHA-256
+        """
+        meta = self._read_meta(key)
+        if not meta:
+            return False
+        entry_dir = self._entry_dir(key)
+        for name, info in meta['files'].items():
+            path = os.path.join(entry_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            # Entries stored before mtimes were recorded are checked by size only
+            if st.st_size != info['size'] or st.st_mtime_ns != info.get('mtime_ns', st.st_mtime_ns):
+                return False
+            if deep and file_digest(path) != info['sha256']:
+                return False
+        return True
+
+    def fetch(self, key, output_dir):
+        """
+        Materialize a cached result into `output_dir`. Returns the list of
+        written files, or None on a miss or a failed integrity check.
+        """
+        with self._lock:
+            if not self.verify(key):
+                if os.path.isdir(self._entry_dir(key)):
+                    logger.warning(f"Result cache entry {key[:12]} failed integrity check, dropping it")
+                    shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+                self.misses += 1
+                return None
+            meta = self._read_meta(key)
+            meta['last_used'] = time.time()
+            self._write_meta(key, meta)
+            self.hits += 1
+
+        os.makedirs(output_dir, exist_ok=True)
+        written = []
+        try:
+            for name in meta['files']:
+                dst = os.path.join(output_dir, name)
+                if os.path.exists(dst):
+                    os.remove(dst)
+                _link_or_copy(os.path.join(self._entry_dir(key), name), dst)
+                written.append(dst)
+        except OSError as e:
+            # Evicted by another process since the check
+            logger.warning(f"Result cache entry {key[:12]} vanished while fetching: {str(e)}")
+            for dst in written:
+                try:
+                    os.remove(dst)
+                except OSError:
+                    pass
+            with self._lock:
+                self.hits -= 1
+                self.misses += 1
+            return None
+        logger.info(f"Result cache hit {key[:12]}: {len(written)} file(s) -> {output_dir}")
+        return written
+
+    def store(self, key, output_dir, files, source=None):
+        """
+        Add the given files from a finished separation in `output_dir`. They
+        are copied, not linked, so later rewrites of the outputs cannot
+        change the cached result.
+        """
+        tmp_dir = self._entry_dir(key) + f'.tmp{os.getpid()}_{threading.get_ident()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        meta = {'source': source, 'created': time.time(), 'last_used': time.time(), 'files': {}}
+        for name in files:
+            dst = os.path.join(tmp_dir, name)
+            shutil.copy2(os.path.join(output_dir, name), dst)
+            st = os.stat(dst)
+            meta['files'][name] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                   'sha256': file_digest(dst)}
+        with open(os.path.join(tmp_dir, META_NAME), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        with self._lock:
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            os.replace(tmp_dir, self._entry_dir(key))
+            self._evict()
+        logger.info(f"Result cache stored {key[:12]} ({len(files)} file(s))")
+
+    def entries(self):
+        """Metadata of every entry, most recently used first"""
+        result = []
+        for key in os.listdir(self.root):
+            meta = self._read_meta(key) if os.path.isdir(self._entry_dir(key)) else None
+            if meta:
+                meta['key'] = key
+                meta['size'] = sum(info['size'] for info in meta['files'].values())
+                result.append(meta)
+        return sorted(result, key=lambda m: m['last_used'], reverse=True)
+
+    def size_bytes(self):
+        return sum(meta['size'] for meta in self.entries())
+
+    def _evict(self):
+        """Remove least recently used entries until under the size cap"""
+        limit = self.max_size_mb * 1024 * 1024
+        entries = self.entries()
+        total = sum(meta['size'] for meta in entries)
+        while entries and total > limit:
+            oldest = entries.pop()
+            shutil.rmtree(self._entry_dir(oldest['key']), ignore_errors=True)
+            total -= oldest['size']
+            logger.info(f"Evicted result cache entry {oldest['key'][:12]}")
+
+    def clear(self):
+        with self._lock:
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self.entries()),
+            'size_mb': self.size_bytes() / (1024 * 1024),
+            'max_size_mb': self.max_size_mb,
+        }
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or clear the separation result cache")
+    parser.add_argument('root', help="Cache directory")
+    parser.add_argument('command', choices=('list', 'verify', 'clear'))
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.root)
+    if args.command == 'clear':
+        cache.clear()
+        print("Result cache cleared.")
+    elif args.command == 'verify':
+        bad = [meta['key'] for meta in cache.entries() if not cache.verify(meta['key'], deep=True)]
+        for key in bad:
+            print(f"❌ {key}")
+        print(f"{len(bad)} corrupt entr{'y' if len(bad) == 1 else 'ies'}")
+        return 1 if bad else 0
+    else:
+        for meta in cache.entries():
+            print(f"{meta['key'][:12]}  {meta['size'] / 1048576:8.1f} MB  "
+                  f"{time.ctime(meta['last_used'])}  {meta.get('source')}")
+        print(f"Total: {cache.size_bytes() / 1048576:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
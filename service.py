@@ -0,0 +1,530 @@
+import os
+import sys
+import json
+import socket
+import asyncio
+import argparse
+import logging
+import http.client
+from types import SimpleNamespace
+from urllib.parse import urlsplit, quote, unquote
+
+from job_scheduler import Job, JobScheduler, FINAL_STATES
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+MAX_BODY_BYTES = 1 << 20
+FILE_CHUNK_BYTES = 1 << 20
+EVENT_INTERVAL = 0.25
+STEM_DIR_SKIP = ('.stems',)
+# Job fields a client may set when submitting
+JOB_FIELDS = ('url', 'input_path', 'priority', 'chunk_seconds', 'output_format', 'quality',
+              'keep_stems', 'only', 'preview_seconds')
+
+_REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large',
+            500: 'Internal Server Error'}
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceError(Exception):
+    """An error response from the separation service"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+# =============================================================================
+# SERVER
+# =============================================================================
+class SeparationService:
+    """
+    Asyncio HTTP/JSON front end for one JobScheduler, so every client
+    shares this process's warm separators and bounded worker pools.
+
+        GET    /health
+        GET    /jobs                      snapshots of every job
+        POST   /jobs                      {"input_path" | "url", "stems", ...}
+        DELETE /jobs                      clear finished jobs
+        GET    /jobs/<id>
+        DELETE /jobs/<id>                 cancel
+        POST   /jobs/<id>/priority        {"priority": n}
+        POST   /jobs/<id>/upgrade         full run of a finished preview
+        GET    /jobs/<id>/events          snapshots as JSON lines until the job ends
+        GET    /jobs/<id>/files           stem files written so far
+        GET    /jobs/<id>/files/<name>    one stem file
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._server = None
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+        if unix_socket:
+            self._server = await asyncio.start_unix_server(self._handle, path=unix_socket)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info(f"Separation service listening on {self.address}")
+        return self._server
+
+    @property
+    def address(self):
+        name = self._server.sockets[0].getsockname()
+        return name if isinstance(name, str) else f"http://{name[0]}:{name[1]}"
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None):
+        await self.start(host, port, unix_socket)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # -------------------------------------------------------------------------
+    # HTTP plumbing (one request per connection)
+    # -------------------------------------------------------------------------
+    async def _handle(self, reader, writer):
+        try:
+            method, path, body = await self._read_request(reader)
+            await self._dispatch(method, path, body, writer)
+        except ServiceError as e:
+            await self._send_json(writer, e.status, {'error': str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Service request failed: {str(e)}", exc_info=True)
+            await self._send_json(writer, 500, {'error': str(e)})
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            raise ConnectionError("Client closed the connection")
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise ServiceError(400, "Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise ServiceError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), unquote(urlsplit(target).path), body
+
+    async def _send_head(self, writer, status, content_type, length=None):
+        lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+                 f"Content-Type: {content_type}", "Connection: close"]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        try:
+            await self._send_head(writer, status, 'application/json', len(body))
+            writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    # -------------------------------------------------------------------------
+    # Routes
+    # -------------------------------------------------------------------------
+    async def _dispatch(self, method, path, body, writer):
+        parts = [part for part in path.split('/') if part]
+        if parts == ['health'] and method == 'GET':
+            from spleeter_utils import MODEL_CACHE
+            return await self._send_json(writer, 200, {
+                'status': 'ok', 'jobs': len(self.scheduler.jobs()),
+                'model_cache': MODEL_CACHE.stats()})
+        if parts == ['jobs']:
+            if method == 'GET':
+                return await self._send_json(writer, 200, self.scheduler.snapshot())
+            if method == 'POST':
+                job = self.scheduler.submit(self._job_from_request(_parse_json(body)))
+                return await self._send_json(writer, 201, job.snapshot())
+            if method == 'DELETE':
+                self.scheduler.clear_finished()
+                return await self._send_json(writer, 200, self.scheduler.snapshot())
+            raise ServiceError(405, f"{method} not allowed on /jobs")
+        if len(parts) < 2 or parts[0] != 'jobs':
+            raise ServiceError(404, f"No such resource: {path}")
+
+        job = self._get_job(parts[1])
+        action = parts[2] if len(parts) > 2 else None
+        if action is None and method == 'GET':
+            return await self._send_json(writer, 200, job.snapshot())
+        if action is None and method == 'DELETE':
+            self.scheduler.cancel(job.id)
+            return await self._send_json(writer, 200, job.snapshot())
+        if action == 'priority' and method == 'POST':
+            priority = _parse_json(body).get('priority')
+            if not isinstance(priority, int):
+                raise ServiceError(400, "priority must be an integer")
+            self.scheduler.set_priority(job.id, priority)
+            return await self._send_json(writer, 200, job.snapshot())
+        if action == 'upgrade' and method == 'POST':
+            try:
+                upgraded = self.scheduler.upgrade_preview(job.id)
+            except ValueError as e:
+                raise ServiceError(409, str(e))
+            return await self._send_json(writer, 201, upgraded.snapshot())
+        if action == 'events' and method == 'GET':
+            return await self._stream_events(job, writer)
+        if action == 'files' and method == 'GET':
+            if len(parts) == 3:
+                return await self._send_json(writer, 200, _list_files(job.output_dir))
+            return await self._send_file(job, '/'.join(parts[3:]), writer)
+        raise ServiceError(405 if action in (None, 'priority', 'upgrade', 'events', 'files') else 404,
+                           f"{method} not allowed on {path}")
+
+    def _get_job(self, job_id):
+        try:
+            job = self.scheduler.get(int(job_id))
+        except ValueError:
+            job = None
+        if job is None:
+            raise ServiceError(404, f"No such job: {job_id}")
+        return job
+
+    def _job_from_request(self, data):
+        unknown = set(data) - set(JOB_FIELDS) - {'stems'}
+        if unknown:
+            raise ServiceError(400, f"Unknown job fields: {', '.join(sorted(unknown))}")
+        _check_job_fields(data)
+        if data.get('input_path') and not os.path.isfile(data['input_path']):
+            raise ServiceError(400, f"Input file not found: {data['input_path']}")
+        try:
+            stems = int(data.get('stems', 2))
+            if stems not in (2, 4, 5):
+                raise ValueError(f"Unsupported stem count: {stems}")
+            return Job(stems, **{name: data[name] for name in JOB_FIELDS if name in data})
+        except (TypeError, ValueError) as e:
+            raise ServiceError(400, str(e))
+
+    async def _stream_events(self, job, writer):
+        """Send the job's snapshot as a JSON line whenever it changes, until it ends"""
+        await self._send_head(writer, 200, 'application/x-ndjson')
+        last = None
+        while True:
+            snapshot = job.snapshot()
+            if snapshot != last:
+                writer.write(json.dumps(snapshot, default=str).encode() + b'\n')
+                await writer.drain()
+                last = snapshot
+            if snapshot['state'] in FINAL_STATES:
+                return
+            await asyncio.sleep(EVENT_INTERVAL)
+
+    async def _send_file(self, job, name, writer):
+        root = os.path.realpath(job.output_dir or '')
+        path = os.path.realpath(os.path.join(root, name))
+        if not job.output_dir or not path.startswith(root + os.sep) or not os.path.isfile(path):
+            raise ServiceError(404, f"No such file: {name}")
+        loop = asyncio.get_running_loop()
+        with open(path, 'rb') as f:
+            await self._send_head(writer, 200, 'application/octet-stream', os.path.getsize(path))
+            while True:
+                chunk = await loop.run_in_executor(None, f.read, FILE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _check_job_fields(data):
+    """Reject wrongly typed job fields before a Job is built (400)"""
+    from stem_encoder import OUTPUT_FORMATS
+
+    for name in ('url', 'input_path'):
+        if data.get(name) is not None and not isinstance(data[name], str):
+            raise ServiceError(400, f"{name} must be a string")
+    if 'priority' in data and not _is_int(data['priority']):
+        raise ServiceError(400, "priority must be an integer")
+    for name in ('chunk_seconds', 'preview_seconds'):
+        value = data.get(name)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))
+                                  or value <= 0):
+            raise ServiceError(400, f"{name} must be a positive number or null")
+    if data.get('quality') is not None and not _is_int(data['quality']):
+        raise ServiceError(400, "quality must be an integer or null")
+    if 'keep_stems' in data and not isinstance(data['keep_stems'], bool):
+        raise ServiceError(400, "keep_stems must be true or false")
+    only = data.get('only')
+    if only is not None and (not isinstance(only, list)
+                             or not all(isinstance(name, str) for name in only)):
+        raise ServiceError(400, "only must be a list of stem names or null")
+    if 'output_format' in data and data['output_format'] not in OUTPUT_FORMATS:
+        raise ServiceError(400, f"Unsupported output format: {data['output_format']}")
+
+
+def _parse_json(body):
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        raise ServiceError(400, "Body is not valid JSON")
+    if not isinstance(data, dict):
+        raise ServiceError(400, "Body must be a JSON object")
+    return data
+
+
+def _list_files(output_dir):
+    """Stem files under `output_dir`, including previews, as [{'name', 'bytes'}]"""
+    files = []
+    if not output_dir or not os.path.isdir(output_dir):
+        return files
+    for dirpath, dirnames, filenames in os.walk(output_dir):
+        dirnames[:] = [d for d in dirnames if d not in STEM_DIR_SKIP]
+        for filename in sorted(filenames):
+            if filename.endswith('.tmp'):
+                continue
+            path = os.path.join(dirpath, filename)
+            files.append({'name': os.path.relpath(path, output_dir).replace(os.sep, '/'),
+                          'bytes': os.path.getsize(path)})
+    return files
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class ServiceClient:
+    """
+    Blocking client for SeparationService. `url` is http://host:port or
+    unix:///path/to/socket.
+    """
+
+    def __init__(self, url=DEFAULT_URL, timeout=30.0):
+        self.url = url
+        self.timeout = timeout
+        parts = urlsplit(url)
+        self._unix_path = parts.path if parts.scheme == 'unix' else None
+        self._host, self._port = parts.hostname or DEFAULT_HOST, parts.port or DEFAULT_PORT
+
+    def _connect(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        if self._unix_path:
+            return _UnixHTTPConnection(self._unix_path, timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=timeout)
+
+    def _open(self, method, path, payload=None, timeout=None):
+        conn = self._connect(timeout)
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            conn.request(method, quote(path), body=body, headers=headers)
+            response = conn.getresponse()
+        except Exception:
+            conn.close()
+            raise
+        if response.status >= 400:
+            try:
+                message = json.loads(response.read() or b'{}').get('error', response.reason)
+            finally:
+                conn.close()
+            raise ServiceError(response.status, message)
+        return conn, response
+
+    def _request(self, method, path, payload=None):
+        conn, response = self._open(method, path, payload)
+        try:
+            data = response.read()
+        finally:
+            conn.close()
+        return json.loads(data) if data else None
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def jobs(self):
+        return self._request('GET', '/jobs')
+
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def submit(self, stems=2, **fields):
+        """Queue a job (see JOB_FIELDS); returns its snapshot"""
+        return self._request('POST', '/jobs', dict(fields, stems=stems))
+
+    def cancel(self, job_id):
+        return self._request('DELETE', f'/jobs/{job_id}')
+
+    def clear_finished(self):
+        return self._request('DELETE', '/jobs')
+
+    def set_priority(self, job_id, priority):
+        return self._request('POST', f'/jobs/{job_id}/priority', {'priority': priority})
+
+    def upgrade_preview(self, job_id):
+        return self._request('POST', f'/jobs/{job_id}/upgrade', {})
+
+    def files(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}/files')
+
+    def events(self, job_id):
+        """Yield the job's snapshots as they change, until it finishes"""
+        conn, response = self._open('GET', f'/jobs/{job_id}/events', timeout=None)
+        try:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+        finally:
+            conn.close()
+
+    def wait(self, job_id):
+        """Block until the job finishes; returns its final snapshot"""
+        snapshot = None
+        for snapshot in self.events(job_id):
+            pass
+        return snapshot
+
+    def download(self, job_id, name, dest_path):
+        """Save stem file `name` of the job to `dest_path`"""
+        conn, response = self._open('GET', f'/jobs/{job_id}/files/{name}')
+        try:
+            with open(dest_path, 'wb') as f:
+                while True:
+                    chunk = response.read(FILE_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        finally:
+            conn.close()
+        return dest_path
+
+
+class RemoteScheduler:
+    """
+    The part of the JobScheduler interface the GUI uses, backed by a running
+    service, so the GUI can act as a thin client without loading a model.
+    Every call is a blocking HTTP request that raises OSError or
+    ServiceError when the service fails (snapshot excepted), so callers keep
+    them off the Tk thread.
+    """
+
+    def __init__(self, url=DEFAULT_URL, timeout=2.0):
+        self.client = ServiceClient(url, timeout)
+        self._last_snapshot = []
+
+    def submit(self, job):
+        fields = {name: getattr(job, name) for name in JOB_FIELDS}
+        fields['only'] = list(job.only) if job.only else None
+        job.id = self.client.submit(job.stems, **fields)['id']
+        return job
+
+    def upgrade_preview(self, job_id):
+        try:
+            return SimpleNamespace(**self.client.upgrade_preview(job_id))
+        except (OSError, ServiceError) as e:
+            raise ValueError(str(e))
+
+    def cancel(self, job_id):
+        self.client.cancel(job_id)
+        return True
+
+    def set_priority(self, job_id, priority):
+        self.client.set_priority(job_id, priority)
+
+    def snapshot(self):
+        """Last known snapshot if the service is briefly unreachable"""
+        try:
+            self._last_snapshot = self.client.jobs()
+        except (OSError, ServiceError) as e:
+            logger.warning(f"Separation service unreachable: {str(e)}")
+        return self._last_snapshot
+
+    def clear_finished(self):
+        self.client.clear_finished()
+
+    def shutdown(self):
+        pass
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+def build_scheduler(data_dir, separate_workers=1, decode_workers=1, max_decoded=2):
+    """A JobScheduler with the GUI's folder layout and caches under `data_dir`"""
+    import tracing
+    import thread_tuner
+    from result_cache import ResultCache
+    from spleeter_utils import configure_pcm_cache
+
+    input_dir = os.path.join(data_dir, 'input')
+    output_dir = os.path.join(data_dir, 'output')
+    temp_dir = os.path.join(input_dir, 'temp_download')
+    cache_dir = os.path.join(data_dir, 'cache')
+    for path in (input_dir, output_dir, temp_dir, cache_dir):
+        os.makedirs(path, exist_ok=True)
+    tracing.configure(metrics_path=os.path.join(data_dir, 'separation_metrics.jsonl'),
+                      rtf_path=os.path.join(cache_dir, 'realtime_factors.json'))
+    thread_tuner.configure(os.path.join(cache_dir, 'thread_profiles.json'))
+    configure_pcm_cache(os.path.join(cache_dir, 'pcm'))
+    return JobScheduler(temp_dir, input_dir, output_dir,
+                        result_cache=ResultCache(os.path.join(cache_dir, 'results')),
+                        workers={'separate': separate_workers, 'decode': decode_workers},
+                        max_decoded=max_decoded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the separation service (no GUI)")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--socket', default=None, help="Listen on this Unix socket instead")
+    parser.add_argument('--data-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="Folder holding input/, output/ and cache/")
+    parser.add_argument('--warm', default='2',
+                        help="Comma-separated stem counts to load at start-up ('' for none)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Concurrent separations (one per model at a time)")
+    parser.add_argument('--max-decoded', type=int, default=2,
+                        help="Decoded songs allowed to wait for the separator")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    scheduler = build_scheduler(args.data_dir, separate_workers=args.workers,
+                                max_decoded=args.max_decoded)
+    from spleeter_utils import warm_up_models
+    for stems in (int(s) for s in args.warm.split(',') if s):
+        warm_up_models(stems, background=True)
+
+    service = SeparationService(scheduler)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import numpy as np
+
+SILENCE_THRESHOLD_DB = -60.0   # dBFS; quieter frames count as silence
+MIN_SILENCE_SECONDS = 2.0      # shorter gaps are still sent to the model
+FRAME_SECONDS = 0.05
+CROSSFADE_SECONDS = 0.05
+PAD_SECONDS = 0.25             # context kept around every audible region
+
+
+def frame_power(waveform, frame):
+    """Mean power of each `frame`-sample block of `waveform`"""
+    channels = waveform.shape[1] if waveform.ndim > 1 else 1
+    samples = waveform.reshape(len(waveform), channels)
+    # einsum avoids materialising a squared copy of the whole track
+    power = np.einsum('ij,ij->i', samples, samples, dtype=np.float64) / channels
+    starts = np.arange(0, len(power), frame)
+    sums = np.add.reduceat(power, starts)
+    counts = np.diff(np.append(starts, len(power)))
+    return sums / counts
+
+
+def frame_levels_db(waveform, frame):
+    """Mean power of each `frame`-sample block of `waveform`, in dBFS"""
+    return 10.0 * np.log10(np.maximum(frame_power(waveform, frame), 1e-20))
+
+
+def loudest_window(waveform, sample_rate, seconds, frame_seconds=FRAME_SECONDS):
+    """(start, stop) sample range of the `seconds`-long stretch with the most energy"""
+    total = len(waveform)
+    length = int(seconds * sample_rate)
+    if total <= length:
+        return 0, total
+    frame = max(1, int(frame_seconds * sample_rate))
+    power = frame_power(waveform, frame)
+    width = max(1, length // frame)
+    cumulative = np.concatenate(([0.0], np.cumsum(power)))
+    best = int(np.argmax(cumulative[width:] - cumulative[:-width]))
+    start = min(best * frame, total - length)
+    return start, start + length
+
+
+def find_active_regions(waveform, sample_rate, threshold_db=SILENCE_THRESHOLD_DB,
+                        min_silence_seconds=MIN_SILENCE_SECONDS, pad_seconds=PAD_SECONDS,
+                        frame_seconds=FRAME_SECONDS):
+    """
+    Sample ranges [(start, stop), ...] of `waveform` that need the model.
+    Everything outside them is silence lasting at least `min_silence_seconds`.
+    """
+    total = len(waveform)
+    if not total:
+        return []
+    frame = max(1, int(frame_seconds * sample_rate))
+    silent = frame_levels_db(waveform, frame) <= threshold_db
+    # Boundaries of runs of silent frames
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_stops = np.flatnonzero(edges == -1)
+    min_frames = max(1, int(np.ceil(min_silence_seconds / frame_seconds)))
+    long_runs = (run_stops - run_starts) >= min_frames
+
+    pad = int(pad_seconds * sample_rate)
+    regions = []
+    cursor = 0
+    for run_start, run_stop in zip(run_starts[long_runs] * frame,
+                                   np.minimum(run_stops[long_runs] * frame, total)):
+        if run_start > cursor:
+            regions.append((cursor, run_start))
+        cursor = run_stop
+    if cursor < total:
+        regions.append((cursor, total))
+
+    # Pad into the surrounding silence and merge regions that now touch
+    merged = []
+    for start, stop in regions:
+        start, stop = max(0, start - pad), min(total, stop + pad)
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], stop)
+        else:
+            merged.append((start, stop))
+    return [(int(start), int(stop)) for start, stop in merged]
+
+
+def _gate_envelope(regions, total, fade):
+    """1.0 inside regions, 0.0 in silence, with linear fades at interior edges"""
+    gate = np.zeros(total, dtype=np.float32)
+    ramp = np.linspace(0.0, 1.0, fade + 2, dtype=np.float32)[1:-1]
+    for start, stop in regions:
+        gate[start:stop] = 1.0
+        length = min(fade, (stop - start) // 2)
+        if start > 0 and length:
+            gate[start:start + length] = ramp[:length]
+        if stop < total and length:
+            gate[stop - length:stop] = ramp[:length][::-1]
+    return gate
+
+
+def separate_gated(separate, waveform, instruments, sample_rate,
+                   threshold_db=SILENCE_THRESHOLD_DB, min_silence_seconds=MIN_SILENCE_SECONDS,
+                   crossfade_seconds=CROSSFADE_SECONDS, passthrough=None, regions=None):
+    """
+    Run `separate(segment) -> {instrument: samples}` only on the audible
+    regions of `waveform`. Silent regions come out as exact zeros in every
+    stem, or, when `passthrough` names an instrument, carry the input audio
+    in that stem so the stems still sum to the input. Region edges fade into
+    the silence over `crossfade_seconds`. Precomputed `regions` (see
+    find_active_regions) skip the detection pass.
+
+    Returns (prediction, skipped_seconds).
+    """
+    total = len(waveform)
+    if regions is None:
+        regions = find_active_regions(waveform, sample_rate, threshold_db, min_silence_seconds)
+    if regions == [(0, total)]:
+        return separate(waveform), 0.0
+
+    prediction = {instrument: np.zeros((total, 2), dtype=np.float32) for instrument in instruments}
+    for start, stop in regions:
+        for instrument, data in separate(waveform[start:stop]).items():
+            prediction[instrument][start:stop] = np.asarray(data, dtype=np.float32)[:stop - start]
+
+    gate = _gate_envelope(regions, total, int(crossfade_seconds * sample_rate))[:, None]
+    for instrument, data in prediction.items():
+        data *= gate
+        if instrument == passthrough:
+            data += (1.0 - gate) * waveform
+    skipped = total - sum(stop - start for start, stop in regions)
+    return prediction, skipped / float(sample_rate)
@@ -1,17 +1,761 @@
 import os
+import time
+import wave
+import threading
 import traceback
-from spleeter.separator import Separator
-from spleeter.audio.adapter import AudioAdapter
+from collections import OrderedDict
 import subprocess
 import logging
 
-# Configure logging
-logging.basicConfig(filename='spleeter_debug.log', level=logging.DEBUG, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+import numpy as np
 
-def separate_music(input_path, output_dir, stems=2):
+from stem_encoder import (OUTPUT_FORMATS, BackgroundStemWriter, encode_stems,
+                          open_stem_writer, stem_filename)
+import thread_tuner
+from silence import loudest_window, separate_gated
+from tracing import Tracer, realtime_factor, record_realtime_factor
+from logging_setup import configure_logging
+
+# Configure logging (a no-op when the application already did)
+configure_logging('spleeter_debug.log')
+
+SAMPLE_RATE = 44100
+_NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+# =============================================================================
+# MODEL CACHE
+# =============================================================================
+# Approximate resident memory of one loaded Spleeter model (graph + weights)
+MODEL_MEMORY_MB = {2: 350, 4: 650, 5: 800}
+DEFAULT_MODEL_CACHE_MB = int(os.environ.get('SPLEETER_MODEL_CACHE_MB', 2048))
+
+_audio_adapter = None
+_audio_adapter_lock = threading.Lock()
+
+
+def get_audio_adapter():
+    """Return the shared AudioAdapter (created once per process)"""
+    global _audio_adapter
+    with _audio_adapter_lock:
+        if _audio_adapter is None:
+            from spleeter.audio.adapter import AudioAdapter
+            _audio_adapter = AudioAdapter.default()
+        return _audio_adapter
+
+
+class _CachedModel:
+    def __init__(self, stems, separator, size_mb):
+        self.stems = stems
+        self.separator = separator
+        self.size_mb = size_mb
+        # Spleeter's prediction generator is not safe for concurrent use
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class ModelCache:
+    """
+    Process-wide LRU cache of warm Spleeter Separator instances, keyed by
+    stem configuration and bounded by an approximate memory budget
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MODEL_CACHE_MB):
+        self.memory_budget_mb = memory_budget_mb
+        self._models = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_times = {}
+
+    def _load(self, stems):
+        # Thread pools are fixed when TensorFlow starts, so size them first
+        thread_tuner.apply_profile(stems)
+        from spleeter.separator import Separator
+        start = time.perf_counter()
+        separator = Separator(f'spleeter:{stems}stems')
+        # Spleeter builds the graph and restores the checkpoint lazily on the
+        # first separate() call, so force it here with a short silent clip
+        separator.separate(np.zeros((SAMPLE_RATE, 2), dtype=np.float32))
+        elapsed = time.perf_counter() - start
+        logging.info(f"Loaded {stems}-stem model in {elapsed:.2f}s")
+        return separator, elapsed
+
+    def _get_entry(self, stems):
+        stems = int(stems)
+        while True:
+            with self._lock:
+                entry = self._models.get(stems)
+                if entry is not None:
+                    self._models.move_to_end(stems)
+                    self.hits += 1
+                    entry.users += 1
+                    return entry
+                pending = self._loading.get(stems)
+                if pending is None:
+                    pending = threading.Event()
+                    self._loading[stems] = pending
+                    self.misses += 1
+                    break
+            # Another thread is loading this model; wait and retry
+            pending.wait()
+
+        try:
+            separator, elapsed = self._load(stems)
+        except Exception:
+            with self._lock:
+                del self._loading[stems]
+            pending.set()
+            raise
+
+        entry = _CachedModel(stems, separator, MODEL_MEMORY_MB.get(stems, 800))
+        with self._lock:
+            self.load_times.setdefault(stems, []).append(elapsed)
+            entry.users += 1
+            self._models[stems] = entry
+            del self._loading[stems]
+            self._evict()
+        pending.set()
+        return entry
+
+    def _evict(self):
+        """Drop least recently used idle models until within budget"""
+        used = sum(e.size_mb for e in self._models.values())
+        for stems in list(self._models):
+            if used <= self.memory_budget_mb or len(self._models) <= 1:
+                break
+            entry = self._models[stems]
+            if entry.users:
+                continue
+            del self._models[stems]
+            used -= entry.size_mb
+            self.evictions += 1
+            logging.info(f"Evicted {stems}-stem model from cache")
+
+    def _release(self, entry):
+        with self._lock:
+            entry.users -= 1
+            self._evict()
+
+    def acquire(self, stems):
+        """
+        Context manager yielding an exclusive, warm Separator for `stems`
+        """
+        return _ModelLease(self, stems)
+
+    def warm_up(self, stems, background=True):
+        """Load the model for `stems` ahead of time"""
+        def _warm():
+            try:
+                entry = self._get_entry(stems)
+                self._release(entry)
+            except Exception as e:
+                logging.warning(f"Model warm-up failed for {stems} stems: {str(e)}")
+
+        if not background:
+            _warm()
+            return None
+        thread = threading.Thread(target=_warm, name=f"warmup-{stems}stems", daemon=True)
+        thread.start()
+        return thread
+
+    def set_memory_budget(self, memory_budget_mb):
+        with self._lock:
+            self.memory_budget_mb = memory_budget_mb
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            for stems in [s for s, e in self._models.items() if not e.users]:
+                del self._models[stems]
+
+    def stats(self):
+        with self._lock:
+            total_loads = sum(len(t) for t in self.load_times.values())
+            total_time = sum(sum(t) for t in self.load_times.values())
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'loaded': list(self._models),
+                'memory_mb': sum(e.size_mb for e in self._models.values()),
+                'memory_budget_mb': self.memory_budget_mb,
+                'load_time_total_s': total_time,
+                'load_time_avg_s': total_time / total_loads if total_loads else 0.0,
+            }
+
+
+class _ModelLease:
+    def __init__(self, cache, stems):
+        self.cache = cache
+        self.stems = stems
+        self.entry = None
+
+    def __enter__(self):
+        self.entry = self.cache._get_entry(self.stems)
+        self.entry.lock.acquire()
+        return self.entry.separator
+
+    def __exit__(self, exc_type, exc, tb):
+        self.entry.lock.release()
+        self.cache._release(self.entry)
+        return False
+
+
+MODEL_CACHE = ModelCache()
+
+
+def warm_up_models(stems, background=True):
+    """Preload the separator for `stems` into the process-wide cache"""
+    return MODEL_CACHE.warm_up(stems, background=background)
+
+
+# =============================================================================
+# STEM SELECTION
+# =============================================================================
+INSTRUMENTAL = 'instrumental'
+MODEL_STEMS = {
+    2: ('vocals', 'accompaniment'),
+    4: ('vocals', 'drums', 'bass', 'other'),
+    5: ('vocals', 'drums', 'bass', 'piano', 'other'),
+}
+# Outputs the 2-stem model produces directly, whatever stem count was asked for
+_TWO_STEM_OUTPUTS = {'vocals', 'accompaniment', INSTRUMENTAL}
+
+
+def plan_stems(stems, only=None):
+    """
+    Decide which model to run for the requested outputs `only` (None means
+    every stem of the `stems` model). Returns (model_stems, outputs).
+
+    Spleeter computes all masks of a model in one pass, so unneeded masks
+    cannot be skipped inside a model; instead, requests that only need
+    vocals and/or the instrumental run the much cheaper 2-stem model.
+    """
+    stems = int(stems)
+    if stems not in MODEL_STEMS:
+        raise ValueError(f"Unsupported stem count: {stems}")
+    if not only:
+        return stems, None
+    outputs = tuple(dict.fromkeys(only))
+    if set(outputs) <= _TWO_STEM_OUTPUTS:
+        return 2, outputs
+    allowed = set(MODEL_STEMS[stems]) | {INSTRUMENTAL}
+    unknown = [name for name in outputs if name not in allowed]
+    if unknown:
+        raise ValueError(f"Stems not produced by the {stems}-stem model: {', '.join(unknown)}")
+    return stems, outputs
+
+
+def select_outputs(prediction, outputs=None):
+    """
+    Keep only `outputs` from `prediction`, deriving the instrumental
+    ("everything except vocals") when it is requested
+    """
+    if outputs is None:
+        return prediction
+    selected = {}
+    for name in outputs:
+        if name in prediction:
+            selected[name] = prediction[name]
+        elif name == INSTRUMENTAL:
+            if 'accompaniment' in prediction:
+                selected[name] = prediction['accompaniment']
+            else:
+                parts = [data for inst, data in prediction.items() if inst != 'vocals']
+                selected[name] = np.sum(parts, axis=0, dtype=np.float32)
+        elif name == 'accompaniment':
+            selected[name] = select_outputs(prediction, (INSTRUMENTAL,))[INSTRUMENTAL]
+        else:
+            raise ValueError(f"Stem not in prediction: {name}")
+    return selected
+
+
+# =============================================================================
+# SILENCE GATING
+# =============================================================================
+# 'zeros' writes exact silence in every stem, 'passthrough' hands the quiet
+# input to the accompaniment (or "other") stem so the stems still sum to it
+SILENCE_MODES = ('off', 'zeros', 'passthrough')
+DEFAULT_SILENCE_MODE = os.environ.get('KARAOKE_SILENCE_GATE', 'zeros')
+
+
+def _separate_gated(separator, waveform, stems, silence=DEFAULT_SILENCE_MODE):
+    """Separate only the audible parts of `waveform`; returns (prediction, skipped_seconds)"""
+    if silence == 'off':
+        return separator.separate(waveform), 0.0
+    instruments = MODEL_STEMS[int(stems)]
+    passthrough = None
+    if silence == 'passthrough':
+        passthrough = 'accompaniment' if 'accompaniment' in instruments else 'other'
+    return separate_gated(separator.separate, waveform, instruments, SAMPLE_RATE,
+                          passthrough=passthrough)
+
+# =============================================================================
+# AUDIO PROBING AND LOADING
+# =============================================================================
+def probe_duration(input_path):
+    """
+    Duration in seconds read from the file header/container metadata, without
+    decoding any audio. Returns None when the duration cannot be determined.
+    """
+    if input_path.lower().endswith('.wav'):
+        try:
+            with wave.open(input_path, 'rb') as wav:
+                return wav.getnframes() / float(wav.getframerate())
+        except (wave.Error, EOFError, OSError):
+            pass  # e.g. float or extensible WAV, let ffprobe handle it
+    cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
+           '-of', 'default=noprint_wrappers=1:nokey=1', input_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=15,
+                                creationflags=_NO_WINDOW)
+        return float(result.stdout.strip().splitlines()[0])
+    except (OSError, ValueError, IndexError, subprocess.SubprocessError) as e:
+        logging.warning(f"Duration probe failed for {input_path}: {str(e)}")
+        return None
+
+
+PCM_CACHE = None
+
+
+def configure_pcm_cache(root, max_size_mb=None):
+    """Enable the decoded-audio cache (see pcm_cache.PCMCache) for this process"""
+    global PCM_CACHE
+    from pcm_cache import PCMCache, DEFAULT_PCM_CACHE_MB
+    PCM_CACHE = PCMCache(root, max_size_mb or DEFAULT_PCM_CACHE_MB)
+    return PCM_CACHE
+
+
+def load_waveform(input_path, sample_rate=SAMPLE_RATE):
+    """
+    Fully decode `input_path` to a stereo float32 waveform at `sample_rate`.
+    With the PCM cache enabled, repeat loads are zero-copy memory maps.
+    """
+    if PCM_CACHE is not None:
+        cached = PCM_CACHE.get(input_path, sample_rate)
+        if cached is not None:
+            logging.info(f"Decoded audio served from PCM cache ({PCM_CACHE.stats()['hit_rate']:.0%} hit rate)")
+            return cached
+    waveform, _ = get_audio_adapter().load(input_path, sample_rate=sample_rate)
+    if PCM_CACHE is not None:
+        from pcm_cache import to_stereo
+        waveform = to_stereo(waveform)
+        try:
+            PCM_CACHE.put(input_path, sample_rate, waveform)
+        except OSError as e:
+            logging.warning(f"Could not cache decoded audio: {str(e)}")
+    return waveform
+
+
+def iter_waveform_blocks(input_path, sample_rate=SAMPLE_RATE, block_seconds=10.0):
+    """
+    Yield stereo float32 blocks of `input_path`, from the PCM cache when
+    possible. A full streaming decode also fills the cache on the way.
+    """
+    block_frames = max(1, int(block_seconds * sample_rate))
+    if PCM_CACHE is not None:
+        cached = PCM_CACHE.get(input_path, sample_rate)
+        if cached is not None:
+            for start in range(0, len(cached), block_frames):
+                yield cached[start:start + block_frames]
+            return
+        writer = PCM_CACHE.writer(input_path, sample_rate)
+        try:
+            for block in stream_audio(input_path, sample_rate, block_seconds):
+                writer.append(block)
+                yield block
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+        return
+    yield from stream_audio(input_path, sample_rate, block_seconds)
+
+
+# =============================================================================
+# STREAMING (CHUNKED) SEPARATION
+# =============================================================================
+DEFAULT_CHUNK_SECONDS = 30.0
+DEFAULT_OVERLAP_SECONDS = 1.0
+
+
+def stream_audio(input_path, sample_rate=SAMPLE_RATE, block_seconds=10.0):
+    """
+    Decode `input_path` with ffmpeg and yield stereo float32 blocks of at
+    most `block_seconds`, without ever holding the whole track in memory
+    """
+    cmd = ['ffmpeg', '-v', 'error', '-nostdin', '-i', input_path,
+           '-f', 'f32le', '-ac', '2', '-ar', str(sample_rate), '-']
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            creationflags=_NO_WINDOW)
+    frame_bytes = 2 * 4
+    block_bytes = max(1, int(block_seconds * sample_rate)) * frame_bytes
+    finished = False
+    try:
+        while True:
+            data = proc.stdout.read(block_bytes)
+            if not data:
+                finished = True
+                break
+            usable = len(data) - len(data) % frame_bytes
+            if usable:
+                yield np.frombuffer(data[:usable], dtype='<f4').reshape(-1, 2)
+    finally:
+        if not finished:
+            proc.kill()
+        proc.stdout.close()
+        stderr = proc.stderr.read().decode(errors='replace')
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"FFmpeg decode failed ({returncode}): {stderr.strip()}")
+
+
+def separate_stream(separator, blocks, sample_rate=SAMPLE_RATE,
+                    chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                    overlap_seconds=DEFAULT_OVERLAP_SECONDS, outputs=None, stems=None,
+                    silence='off', stats=None):
+    """
+    Separate an iterable of waveform blocks in overlapping windows.
+
+    Yields dicts of instrument -> finished samples, in order. Adjacent windows
+    overlap by `overlap_seconds` and are joined with a linear crossfade, so
+    memory use depends on the window size and not on the track length.
+    `outputs` restricts and derives stems as in select_outputs. Unless
+    `silence` is 'off', silent stretches of each window skip the `stems`
+    model (see silence.py) and `stats['skipped_seconds']` adds them up.
+    """
+    if silence != 'off' and stems is None:
+        raise ValueError("stems is required for silence gating")
+    if stats is not None:
+        stats.setdefault('skipped_seconds', 0.0)
+    window = int(chunk_seconds * sample_rate)
+    overlap = int(overlap_seconds * sample_rate)
+    if window <= 2 * overlap:
+        raise ValueError("chunk_seconds must be more than twice overlap_seconds")
+    fade_in = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+    fade_out = 1.0 - fade_in
+
+    previous_tail = None
+
+    def _process(segment, final):
+        nonlocal previous_tail
+        prediction, skipped = _separate_gated(separator, segment, stems, silence)
+        if stats is not None:
+            stats['skipped_seconds'] += skipped
+        prediction = select_outputs(prediction, outputs)
+        tails = {}
+        output = {}
+        for instrument, data in prediction.items():
+            data = np.asarray(data, dtype=np.float32)[:len(segment)]
+            if previous_tail is not None:
+                data = data.copy()
+                data[:overlap] = previous_tail[instrument] * fade_out + data[:overlap] * fade_in
+            if final:
+                output[instrument] = data
+            else:
+                output[instrument] = data[:-overlap]
+                tails[instrument] = data[-overlap:]
+        previous_tail = tails or None
+        return output
+
+    buffer = np.empty((0, 2), dtype=np.float32)
+    for block in blocks:
+        buffer = np.concatenate([buffer, block]) if len(buffer) else block
+        while len(buffer) >= window:
+            yield _process(buffer[:window], final=False)
+            buffer = buffer[window - overlap:]
+
+    if previous_tail is None:
+        if len(buffer):
+            yield _process(buffer, final=True)
+    elif len(buffer) > overlap:
+        yield _process(buffer, final=True)
+    else:
+        # Stream ended exactly on a window boundary
+        yield dict(previous_tail)
+
+
+def _separate_streaming(input_path, output_dir, stems, chunk_seconds, overlap_seconds,
+                        waveform=None, output_format='wav', quality=None, keep_stems=False,
+                        outputs=None, tracer=None, silence=DEFAULT_SILENCE_MODE):
+    from remix import StemStore
+    tracer = tracer or Tracer()
+    writers = {}
+    store = StemStore(output_dir) if keep_stems else None
+    if waveform is not None:
+        total_frames = len(waveform)
+    else:
+        total_frames = int((probe_duration(input_path) or 0) * SAMPLE_RATE)
+    done_frames = 0
+    stream_rtf = realtime_factor('stream', stems)
+    stream_span = tracer.span('stream', samples=0, chunks=0)
+    gate_stats = {}
+    try:
+        # Model loading stays outside the span; decoding and encoding overlap
+        # with inference and are inside it, so its timing is kept as 'stream'
+        with MODEL_CACHE.acquire(stems) as separator, stream_span:
+            if waveform is not None:
+                blocks = [waveform]
+            else:
+                blocks = iter_waveform_blocks(input_path, SAMPLE_RATE, block_seconds=chunk_seconds)
+            for index, chunk in enumerate(separate_stream(
+                    separator, blocks, SAMPLE_RATE, chunk_seconds, overlap_seconds, outputs,
+                    stems=stems, silence=silence, stats=gate_stats)):
+                done_frames += len(next(iter(chunk.values())))
+                stream_span.set(samples=done_frames, chunks=index + 1,
+                                skipped_seconds=gate_stats['skipped_seconds'])
+                if total_frames:
+                    remaining = max(0, total_frames - done_frames) / SAMPLE_RATE
+                    tracer.progress(done_frames / total_frames, 'separate',
+                                    stream_rtf * remaining)
+                for instrument, data in chunk.items():
+                    if instrument not in writers:
+                        output_path = os.path.join(output_dir, stem_filename(instrument, output_format))
+                        logging.info(f"Streaming to: {output_path}")
+                        # Each stem encodes on its own thread, overlapping with inference
+                        writers[instrument] = BackgroundStemWriter(
+                            open_stem_writer(output_path, output_format, quality, SAMPLE_RATE))
+                    writers[instrument].write(data)
+                    if store is not None:
+                        store.append(instrument, data)
+                logging.debug(f"Chunk {index} written")
+    finally:
+        for writer in writers.values():
+            writer.close()
+        if store is not None:
+            store.close()
+    frames = next(iter(writers.values())).frames if writers else 0
+    skipped = gate_stats.get('skipped_seconds', 0.0)
+    logging.info(f"Streaming separation wrote {frames / SAMPLE_RATE:.1f}s per stem, "
+                 f"skipped {skipped:.1f}s of silence")
+    record_realtime_factor('stream', stems, stream_span.duration,
+                           max(0.0, frames / SAMPLE_RATE - skipped))
+    stream_span.set(bytes=sum(os.path.getsize(w.path) for w in writers.values()))
+    for writer in writers.values():
+        logging.info(f"Encoded {os.path.basename(writer.path)} in {writer.seconds:.2f}s "
+                     f"({os.path.getsize(writer.path) / 1048576:.1f} MB)")
+    return [os.path.basename(writer.path) for writer in writers.values()]
+
+
+def separate_waveform(waveform, stems, tracer=None, progress_range=(0.1, 0.85),
+                      silence=DEFAULT_SILENCE_MODE, preview=None):
+    """
+    Run a warm separator from the model cache over a decoded waveform.
+    Progress across `progress_range` is estimated from this machine's
+    measured real-time factor while the model runs. Silent stretches are
+    skipped according to `silence` (see SILENCE_MODES), and the excerpt
+    already separated by a matching `preview` (see separate_preview) is
+    spliced in instead of being separated again.
+    """
+    tracer = tracer or Tracer()
+    audio_seconds = len(waveform) / float(SAMPLE_RATE)
+    parts = _parts_around_preview(len(waveform), stems, silence, preview)
+    model_seconds = sum(stop - start for start, stop in parts) / float(SAMPLE_RATE)
+    reused = audio_seconds - model_seconds
+    logging.info("Separating audio...")
+    with MODEL_CACHE.acquire(stems) as separator:
+        with tracer.span('separate', samples=len(waveform), stems=stems) as span:
+            tracer.expect('separate', realtime_factor('separate', stems) * model_seconds,
+                          *progress_range)
+            if reused:
+                prediction, skipped = _separate_with_preview(separator, waveform, stems,
+                                                             silence, preview, parts)
+            else:
+                prediction, skipped = _separate_gated(separator, waveform, stems, silence)
+            span.set(skipped_seconds=skipped, reused_seconds=reused)
+    tracer.progress(progress_range[1], 'separate')
+    if skipped:
+        logging.info(f"Skipped {skipped:.1f}s of silence ({skipped / audio_seconds:.0%} of the track)")
+    if reused:
+        logging.info(f"Reused {reused:.1f}s already separated by the preview")
+    record_realtime_factor('separate', stems, span.duration, max(0.0, model_seconds - skipped))
+    logging.info(f"Separation complete (model cache: {MODEL_CACHE.stats()})")
+    return prediction
+
+
+# =============================================================================
+# PREVIEW
+# =============================================================================
+DEFAULT_PREVIEW_SECONDS = 20.0
+PREVIEW_DIR = 'preview'
+# Context dropped at each inner edge of a reused preview (edge artefacts),
+# and the crossfade into the freshly separated audio
+PREVIEW_MARGIN_SECONDS = 1.0
+PREVIEW_CROSSFADE_SECONDS = 0.1
+
+
+def separate_preview(input_path, output_dir, stems=2, seconds=DEFAULT_PREVIEW_SECONDS,
+                     output_format='wav', quality=None, only=None, waveform=None, tracer=None,
+                     silence=DEFAULT_SILENCE_MODE):
+    """
+    Separate only the loudest `seconds` of `input_path` with the warm model
+    and write the stems to `<output_dir>/preview`. Returns a preview dict;
+    passing it to separate_music / separate_waveform as `preview` lets the
+    full run skip the excerpt.
+    """
+    tracer = tracer or Tracer()
+    model_stems, outputs = plan_stems(stems, only)
+    if waveform is None:
+        with tracer.span('decode', bytes=os.path.getsize(input_path)) as span:
+            waveform = load_waveform(input_path, SAMPLE_RATE)
+            span.set(samples=len(waveform))
+    start, stop = loudest_window(waveform, SAMPLE_RATE, seconds)
+    logging.info(f"Previewing {start / SAMPLE_RATE:.1f}s - {stop / SAMPLE_RATE:.1f}s "
+                 f"of {os.path.basename(input_path)}")
+    with MODEL_CACHE.acquire(model_stems) as separator:
+        with tracer.span('preview', samples=stop - start, stems=model_stems,
+                         start_seconds=start / SAMPLE_RATE):
+            prediction, skipped = _separate_gated(separator, waveform[start:stop], model_stems,
+                                                  silence)
+    preview_dir = os.path.join(output_dir, PREVIEW_DIR)
+    os.makedirs(preview_dir, exist_ok=True)
+    files = save_stems(select_outputs(prediction, outputs), preview_dir, SAMPLE_RATE,
+                       output_format, quality, tracer=tracer)
+    return {
+        'start': start,
+        'stop': stop,
+        'frames': len(waveform),
+        'stems': model_stems,
+        'silence': silence,
+        'prediction': prediction,
+        'skipped_seconds': skipped,
+        'files': files,
+    }
+
+
+def _parts_around_preview(total, stems, silence, preview):
+    """
+    Sample ranges the model still has to separate when `preview` is reused;
+    [(0, total)] when it cannot be (other model, settings or audio)
+    """
+    if (not preview or preview['stems'] != stems or preview['silence'] != silence
+            or preview['frames'] != total):
+        return [(0, total)]
+    margin = int(PREVIEW_MARGIN_SECONDS * SAMPLE_RATE)
+    fade = int(PREVIEW_CROSSFADE_SECONDS * SAMPLE_RATE)
+    keep_start = preview['start'] + margin if preview['start'] > 0 else 0
+    keep_stop = preview['stop'] - margin if preview['stop'] < total else total
+    if keep_stop - keep_start <= 2 * fade:
+        return [(0, total)]
+    parts = []
+    if keep_start > 0:
+        parts.append((0, keep_start + fade))
+    if keep_stop < total:
+        parts.append((keep_stop - fade, total))
+    return parts
+
+
+def _separate_with_preview(separator, waveform, stems, silence, preview, parts):
+    """Separate `parts` and crossfade them with the preview's excerpt in between"""
+    if not parts:
+        # The preview already covered the whole track
+        return ({instrument: np.array(data, dtype=np.float32)
+                 for instrument, data in preview['prediction'].items()},
+                preview.get('skipped_seconds', 0.0))
+    total = len(waveform)
+    fade = int(PREVIEW_CROSSFADE_SECONDS * SAMPLE_RATE)
+    keep_start = parts[0][1] - fade if parts[0][0] == 0 else 0
+    keep_stop = parts[-1][0] + fade if parts[-1][1] == total else total
+    offset = preview['start']
+    segments = [(keep_start, keep_stop,
+                 {instrument: data[keep_start - offset:keep_stop - offset]
+                  for instrument, data in preview['prediction'].items()})]
+    skipped = 0.0
+    for start, stop in parts:
+        prediction, part_skipped = _separate_gated(separator, waveform[start:stop], stems, silence)
+        segments.append((start, stop, prediction))
+        skipped += part_skipped
+    segments.sort(key=lambda segment: segment[0])
+
+    output = {instrument: np.empty((total, 2), dtype=np.float32)
+              for instrument in preview['prediction']}
+    previous_stop = 0
+    for start, stop, prediction in segments:
+        overlap = max(0, previous_stop - start)
+        ramp = np.linspace(0.0, 1.0, overlap + 2, dtype=np.float32)[1:-1, None]
+        for instrument, data in prediction.items():
+            data = np.asarray(data, dtype=np.float32)[:stop - start]
+            target = output[instrument]
+            target[start:start + overlap] = (target[start:start + overlap] * (1.0 - ramp)
+                                             + data[:overlap] * ramp)
+            target[start + overlap:stop] = data[overlap:]
+        previous_stop = stop
+    return output, skipped
+
+
+def save_stems(prediction, output_dir, sample_rate=SAMPLE_RATE, output_format='wav',
+               quality=None, stats=None, tracer=None):
+    """
+    Encode every instrument in `prediction` concurrently in `output_format`
+    (wav, flac, mp3 or opus); returns the file names. Per-stem encode time
+    and size are added to `stats` when given.
+    """
+    tracer = tracer or Tracer()
+    logging.info(f"Saving {len(prediction)} stem(s) as {output_format} to {output_dir}")
+    samples = sum(len(data) for data in prediction.values())
+    with tracer.span('save', samples=samples, format=output_format) as span:
+        encoded = encode_stems(prediction, output_dir, output_format, quality, sample_rate)
+        span.set(bytes=sum(info['bytes'] for info in encoded.values()))
+    if stats is not None:
+        stats.update(encoded)
+    return [info['file'] for info in encoded.values()]
+
+
+def _separate_full(input_path, output_dir, stems, waveform=None, output_format='wav',
+                   quality=None, keep_stems=False, outputs=None, tracer=None,
+                   silence=DEFAULT_SILENCE_MODE, preview=None):
+    tracer = tracer or Tracer()
+    # Load audio, unless the caller already decoded it
+    if waveform is None:
+        logging.info("Loading audio...")
+        with tracer.span('decode', bytes=os.path.getsize(input_path)) as span:
+            waveform = load_waveform(input_path, SAMPLE_RATE)
+            span.set(samples=len(waveform))
+        logging.info(f"Audio loaded, shape: {waveform.shape}")
+    else:
+        logging.info(f"Reusing decoded audio, shape: {waveform.shape}")
+    tracer.progress(0.1, 'decode', eta_seconds=realtime_factor('separate', stems) * len(waveform) / SAMPLE_RATE)
+    
+    prediction = select_outputs(separate_waveform(waveform, stems, tracer, silence=silence,
+                                                  preview=preview),
+                                outputs)
+    if keep_stems:
+        from remix import StemStore
+        StemStore(output_dir).write_prediction(prediction)
+    return save_stems(prediction, output_dir, SAMPLE_RATE, output_format, quality, tracer=tracer)
+
+
+def separate_music(input_path, output_dir, stems=2, chunk_seconds=None,
+                   overlap_seconds=DEFAULT_OVERLAP_SECONDS, result_cache=None,
+                   waveform=None, output_format='wav', quality=None, keep_stems=False,
+                   only=None, progress_callback=None, tracer=None,
+                   silence=DEFAULT_SILENCE_MODE, preview=None):
     """
     Separate audio file into stems with robust path handling
+
+    When `chunk_seconds` is set the file is decoded, separated and written
+    in overlapping windows so peak memory is bounded by the window size.
+    With a `result_cache` (see result_cache.ResultCache) a previously
+    separated identical input is materialized instead of re-running the model.
+    A `waveform` already decoded at 44.1 kHz (see load_waveform) is used
+    as-is instead of decoding `input_path` again. Stems are written in
+    `output_format` (see stem_encoder.OUTPUT_FORMATS) at `quality`. With
+    `keep_stems` a memory-mapped float32 copy is kept for instant remixing
+    (see remix.py). `only` limits the outputs to the named stems, plus the
+    derived "instrumental"; see plan_stems for how the model is chosen.
+
+    Every stage is recorded as a structured span on `tracer` (see
+    tracing.Tracer), and `progress_callback(fraction, stage, eta_seconds)`
+    receives fractional progress while the separation runs.
+
+    `silence` (see SILENCE_MODES) skips the model on silent stretches,
+    writing exact zeros or passing the input through to the accompaniment.
+    A `preview` from separate_preview lets a whole-file run reuse the
+    excerpt it already separated; streaming runs (`chunk_seconds`) ignore
+    it with a warning.
     """
     try:
         # Sanitize paths
@@ -25,6 +769,13 @@ def separate_music(input_path, output_dir, stems=2):
         logging.info(f"Starting separation: {input_path}")
         logging.info(f"Output directory: {output_dir}")
         logging.info(f"Stems: {stems}")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        if silence not in SILENCE_MODES:
+            raise ValueError(f"Unsupported silence mode: {silence}")
+        model_stems, outputs = plan_stems(stems, only)
+        if outputs is not None:
+            logging.info(f"Requested outputs: {', '.join(outputs)} ({model_stems}-stem model)")
         
         # Create output directory if missing
         os.makedirs(output_dir, exist_ok=True)
@@ -37,27 +788,42 @@ def separate_music(input_path, output_dir, stems=2):
         os.remove(test_file)
         logging.info("Write test successful")
 
-        # Initialize separator
-        separator = Separator(f'spleeter:{stems}stems')
-        audio_loader = AudioAdapter.default()
-        sample_rate = 44100
-        
-        # Load audio
-        logging.info("Loading audio...")
-        waveform, _ = audio_loader.load(input_path, sample_rate=sample_rate)
-        logging.info(f"Audio loaded, shape: {waveform.shape}")
-        
-        # Perform separation
-        logging.info("Separating audio...")
-        prediction = separator.separate(waveform)
-        logging.info("Separation complete")
-        
-        # Save each instrument
-        for instrument, data in prediction.items():
-            output_path = os.path.join(output_dir, f"{instrument}.wav")
-            logging.info(f"Saving: {output_path}")
-            audio_loader.save(output_path, data, sample_rate, 'wav')
+        tracer = tracer or Tracer(progress_callback, label=os.path.basename(input_path))
+        cache_key = None
+        if result_cache is not None:
+            cache_key = result_cache.key(input_path, model_stems, format=output_format,
+                                         quality=quality, outputs=outputs, silence=silence)
+            with tracer.span('cache_lookup') as span:
+                hit = result_cache.fetch(cache_key, output_dir)
+                span.set(hit=bool(hit))
+            if hit:
+                logging.info("Separation served from result cache")
+                tracer.progress(1.0, 'done', 0.0)
+                return True
+
+        if chunk_seconds:
+            logging.info(f"Streaming mode: {chunk_seconds}s windows, {overlap_seconds}s overlap")
+            if preview is not None:
+                logging.warning("Preview reuse is not available in streaming mode; "
+                                "separating the whole file in windows")
+            written = _separate_streaming(input_path, output_dir, model_stems, chunk_seconds,
+                                          overlap_seconds, waveform=waveform,
+                                          output_format=output_format, quality=quality,
+                                          keep_stems=keep_stems, outputs=outputs, tracer=tracer,
+                                          silence=silence)
+        else:
+            written = _separate_full(input_path, output_dir, model_stems, waveform=waveform,
+                                     output_format=output_format, quality=quality,
+                                     keep_stems=keep_stems, outputs=outputs, tracer=tracer,
+                                     silence=silence, preview=preview)
+
+        if cache_key is not None:
+            try:
+                result_cache.store(cache_key, output_dir, written, source=input_path)
+            except Exception as e:
+                logging.warning(f"Could not store result in cache: {str(e)}")
         
+        tracer.progress(1.0, 'done', 0.0)
         logging.info("Separation successful")
         return True
         
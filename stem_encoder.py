@@ -0,0 +1,180 @@
+import os
+import time
+import wave
+import queue
+import threading
+import subprocess
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+_NO_WINDOW = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+# Per-format encoder settings. `quality` means FLAC compression level (0-12)
+# or MP3/Opus bitrate in kbps; WAV is always 16-bit PCM.
+OUTPUT_FORMATS = {
+    'wav': {'ext': 'wav', 'default_quality': None},
+    'flac': {'ext': 'flac', 'codec': 'flac', 'default_quality': 5,
+             'quality_args': lambda q: ['-compression_level', str(q)]},
+    'mp3': {'ext': 'mp3', 'codec': 'libmp3lame', 'default_quality': 320,
+            'quality_args': lambda q: ['-b:a', f'{q}k']},
+    # libopus only accepts 48/24/16/12/8 kHz input
+    'opus': {'ext': 'opus', 'codec': 'libopus', 'default_quality': 160,
+             'quality_args': lambda q: ['-b:a', f'{q}k', '-ar', '48000']},
+}
+
+logger = logging.getLogger(__name__)
+
+
+def stem_filename(instrument, output_format='wav'):
+    return f"{instrument}.{OUTPUT_FORMATS[output_format]['ext']}"
+
+# =============================================================================
+# STEM WRITERS
+# =============================================================================
+class WavStemWriter:
+    """Append-only 16-bit PCM WAV writer for incrementally produced stems"""
+
+    def __init__(self, path, sample_rate=SAMPLE_RATE, channels=2):
+        self.path = path
+        self.frames = 0
+        self._wav = wave.open(path, 'wb')
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+
+    def write(self, data):
+        pcm = np.clip(data, -1.0, 1.0) * 32767.0
+        self._wav.writeframes(pcm.astype('<i2').tobytes())
+        self.frames += len(data)
+
+    def close(self):
+        self._wav.close()
+
+
+class FFmpegStemWriter:
+    """Append-only writer that pipes float32 samples into an ffmpeg encoder"""
+
+    def __init__(self, path, output_format, quality=None, sample_rate=SAMPLE_RATE, channels=2):
+        spec = OUTPUT_FORMATS[output_format]
+        quality = spec['default_quality'] if quality is None else quality
+        self.path = path
+        self.frames = 0
+        cmd = ['ffmpeg', '-y', '-v', 'error', '-nostdin',
+               '-f', 'f32le', '-ar', str(sample_rate), '-ac', str(channels), '-i', '-',
+               '-c:a', spec['codec']] + spec['quality_args'](quality) + [path]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+                                      creationflags=_NO_WINDOW)
+
+    def write(self, data):
+        self._proc.stdin.write(np.ascontiguousarray(data, dtype='<f4').tobytes())
+        self.frames += len(data)
+
+    def close(self):
+        self._proc.stdin.close()
+        stderr = self._proc.stderr.read().decode(errors='replace')
+        self._proc.stderr.close()
+        if self._proc.wait() != 0:
+            raise RuntimeError(f"FFmpeg encode failed for {self.path}: {stderr.strip()}")
+
+
+def open_stem_writer(path, output_format='wav', quality=None, sample_rate=SAMPLE_RATE):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    # Unlink first: the old file may be a hardlink into the result cache,
+    # which truncating it in place would overwrite
+    if os.path.lexists(path):
+        os.remove(path)
+    if output_format == 'wav':
+        return WavStemWriter(path, sample_rate)
+    return FFmpegStemWriter(path, output_format, quality, sample_rate)
+
+
+class BackgroundStemWriter:
+    """
+    Wraps a stem writer so encoding runs on its own thread; `write` only
+    queues the chunk, letting inference continue while earlier chunks encode
+    """
+
+    def __init__(self, writer, max_pending=4):
+        self.writer = writer
+        self.path = writer.path
+        self.seconds = 0.0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name=f"encode-{os.path.basename(writer.path)}")
+        self._thread.start()
+
+    @property
+    def frames(self):
+        return self.writer.frames
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                break
+            if self._error is not None:
+                continue
+            start = time.perf_counter()
+            try:
+                self.writer.write(data)
+            except Exception as e:
+                self._error = e
+            self.seconds += time.perf_counter() - start
+
+    def write(self, data):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(data)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        start = time.perf_counter()
+        try:
+            self.writer.close()
+        finally:
+            self.seconds += time.perf_counter() - start
+        if self._error is not None:
+            raise self._error
+
+# =============================================================================
+# PARALLEL ENCODING
+# =============================================================================
+def _encode_one(instrument, data, output_dir, output_format, quality, sample_rate):
+    path = os.path.join(output_dir, stem_filename(instrument, output_format))
+    start = time.perf_counter()
+    writer = open_stem_writer(path, output_format, quality, sample_rate)
+    try:
+        writer.write(data)
+    finally:
+        writer.close()
+    return {
+        'file': os.path.basename(path),
+        'seconds': time.perf_counter() - start,
+        'bytes': os.path.getsize(path),
+    }
+
+
+def encode_stems(prediction, output_dir, output_format='wav', quality=None,
+                 sample_rate=SAMPLE_RATE, workers=None):
+    """
+    Encode every stem in `prediction` concurrently. Returns a dict of
+    instrument -> {'file', 'seconds', 'bytes'}.
+    """
+    workers = workers or min(len(prediction), os.cpu_count() or 1) or 1
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='encode') as pool:
+        futures = {
+            instrument: pool.submit(_encode_one, instrument, data, output_dir,
+                                    output_format, quality, sample_rate)
+            for instrument, data in prediction.items()
+        }
+        stats = {instrument: future.result() for instrument, future in futures.items()}
+    for instrument, info in stats.items():
+        logger.info(f"Encoded {info['file']} in {info['seconds']:.2f}s "
+                    f"({info['bytes'] / 1048576:.1f} MB)")
+    return stats
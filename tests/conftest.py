@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+import wave
+
+import numpy as np
+import pytest
+
+# The modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import spleeter_utils  # noqa: E402
+
+
+class StandInSeparator:
+    """Splits the input 1:3 into vocals and accompaniment; `gate` can hold it back"""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+        self.started = threading.Event()
+
+    def separate(self, waveform):
+        self.started.set()
+        self.gate.wait(10)
+        return {'vocals': waveform * 0.25, 'accompaniment': waveform * 0.75}
+
+
+def _stand_in_decode(input_path, sample_rate=spleeter_utils.SAMPLE_RATE):
+    with wave.open(input_path, 'rb') as wav:
+        seconds = wav.getnframes() / float(wav.getframerate())
+    rng = np.random.RandomState(len(input_path))
+    return rng.uniform(-0.5, 0.5, (int(seconds * sample_rate), 2)).astype(np.float32)
+
+
+@pytest.fixture
+def separator(monkeypatch):
+    """A stand-in for every model in MODEL_CACHE, with decoding stubbed too"""
+    separator = StandInSeparator()
+    spleeter_utils.MODEL_CACHE.clear()
+    monkeypatch.setattr(spleeter_utils.MODEL_CACHE, '_load', lambda stems: (separator, 0.0))
+    monkeypatch.setattr(spleeter_utils, 'load_waveform', _stand_in_decode)
+    yield separator
+    separator.gate.set()
+    spleeter_utils.MODEL_CACHE.clear()
+
+
+@pytest.fixture
+def write_input(tmp_path):
+    """write_input(name, seconds): a small WAV whose header gives the duration"""
+    def write(name, seconds):
+        path = str(tmp_path / name)
+        with wave.open(path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(1)
+            wav.setframerate(8000)
+            wav.writeframes(b'\x80' * int(seconds * 8000))
+        return path
+    return write
@@ -0,0 +1,158 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from downloader import HttpBackend, HttpStreamer, download_audio
+
+DATA = bytes(range(256)) * 4096  # 1 MiB
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Range'), self.client_address))
+        if self.path == '/redir':
+            self._send_head(302, {'Location': '/song.mp3', 'Content-Length': '0'})
+        elif self.path == '/named':
+            self._send_data(DATA, {'Content-Disposition': 'attachment; filename="track.flac"'})
+        elif self.path == '/cut' and not self.headers.get('Range'):
+            # Promise everything, send half, drop the connection
+            self._send_head(200, {'Content-Length': str(len(DATA))})
+            self.wfile.write(DATA[:len(DATA) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self._send_data(DATA)
+
+    def _send_head(self, status, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+    def _send_data(self, data, headers=None):
+        headers = dict(headers or {})
+        offset = 0
+        if self.headers.get('Range'):
+            offset = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            headers['Content-Range'] = f"bytes {offset}-{len(data) - 1}/{len(data)}"
+        headers['Content-Length'] = str(len(data) - offset)
+        self._send_head(206 if offset else 200, headers)
+        self.wfile.write(data[offset:])
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def streamer():
+    streamer = HttpStreamer(timeout=5, retries=3, backoff=0.0, chunk_size=64 * 1024)
+    yield streamer
+    streamer.close()
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_redirect_is_followed_and_names_the_file(server, tmp_path):
+    backend = HttpBackend(HttpStreamer(backoff=0.0))
+    try:
+        path = backend.download(f"{server.url}/redir", str(tmp_path))
+    finally:
+        backend.close()
+
+    assert os.path.basename(path) == 'song.mp3'
+    assert _read(path) == DATA
+    assert [request[0] for request in server.requests] == ['/redir', '/song.mp3']
+
+
+def test_content_disposition_names_the_file(server, tmp_path):
+    backend = HttpBackend(HttpStreamer(backoff=0.0))
+    try:
+        path = backend.download(f"{server.url}/named", str(tmp_path))
+    finally:
+        backend.close()
+
+    assert os.path.basename(path) == 'track.flac'
+
+
+def test_cut_off_response_is_resumed_with_range(server, streamer, tmp_path):
+    dest = str(tmp_path / 'cut.mp3')
+
+    streamer.fetch(f"{server.url}/cut", dest)
+
+    assert _read(dest) == DATA
+    assert not os.path.exists(dest + '.part')
+    ranges = [request[1] for request in server.requests]
+    assert ranges == [None, f"bytes={len(DATA) // 2}-"]
+
+
+def test_connections_are_reused(server, streamer, tmp_path):
+    for name in ('a.mp3', 'b.mp3', 'c.mp3'):
+        streamer.fetch(f"{server.url}/song.mp3", str(tmp_path / name))
+
+    clients = {request[2] for request in server.requests}
+    assert len(server.requests) == 3
+    assert len(clients) == 1
+
+
+def test_progress_callback_abort_closes_the_connection(server, streamer, tmp_path):
+    class Cancelled(Exception):
+        pass
+
+    opened = []
+    connect = streamer._connection
+
+    def tracking_connection(scheme, netloc):
+        conn = connect(scheme, netloc)
+        opened.append(conn)
+        return conn
+    streamer._connection = tracking_connection
+
+    def cancel(done, total):
+        raise Cancelled()
+
+    dest = str(tmp_path / 'song.mp3')
+    with pytest.raises(Cancelled):
+        streamer.fetch(f"{server.url}/song.mp3", dest, progress_callback=cancel)
+
+    assert opened and all(conn.sock is None for conn in opened)
+    # The partial file is kept and a later fetch resumes it
+    streamer.fetch(f"{server.url}/song.mp3", dest)
+    assert _read(dest) == DATA
+    assert server.requests[-1][1] is not None
+
+
+def test_download_audio_keeps_same_titled_songs_apart(server, tmp_path):
+    final_dir = tmp_path / 'input'
+    final_dir.mkdir()
+    backend = HttpBackend(HttpStreamer(backoff=0.0))
+    try:
+        paths = [download_audio(f"{server.url}/redir", str(tmp_path / 'temp'), str(final_dir),
+                                backend=backend) for _ in range(2)]
+    finally:
+        backend.close()
+
+    assert paths[0] != paths[1]
+    for path in paths:
+        assert os.path.dirname(path) == str(final_dir)
+        assert os.path.basename(path).startswith('song_') and path.endswith('.mp3')
+        assert _read(path) == DATA
+    assert os.listdir(tmp_path / 'temp') == []
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from job_scheduler import Job, JobScheduler, CANCELLED, DONE, QUEUED, SEPARATING
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def scheduler(tmp_path, separator):
+    scheduler = JobScheduler(str(tmp_path / 'temp'), str(tmp_path / 'input'),
+                             str(tmp_path / 'output'), max_decoded=1)
+    yield scheduler
+    separator.gate.set()
+    scheduler.shutdown()
+
+
+def test_job_waiting_for_a_decode_slot_does_not_hold_the_decoder(scheduler, separator,
+                                                                 write_input):
+    separator.gate.clear()
+    running = scheduler.submit(Job(2, input_path=write_input('a.wav', 2)))
+    _wait_for(lambda: running.state == SEPARATING)
+
+    # The only slot is taken: this job parks instead of blocking the decode worker
+    parked = scheduler.submit(Job(2, input_path=write_input('b.wav', 2)))
+    _wait_for(lambda: parked.waiting_for_slot and parked.state == QUEUED)
+    waiting = scheduler.submit(Job(2, input_path=write_input('c.wav', 2)))
+    _wait_for(lambda: waiting.waiting_for_slot)
+
+    # ...so cancelling it takes effect at once
+    assert scheduler.cancel(parked.id)
+    assert parked.state == CANCELLED
+
+    separator.gate.set()
+    _wait_for(lambda: waiting.state == DONE)
+    assert running.state == DONE
+    assert parked.state == CANCELLED
+
+
+def test_cancel_during_cache_check_sticks(scheduler, write_input):
+    class SlowCache:
+        def key(self, *args, **options):
+            return 'key'
+
+        def fetch(self, key, output_dir):
+            time.sleep(0.3)
+            return ['vocals.wav']
+
+    scheduler.result_cache = SlowCache()
+    job = scheduler.submit(Job(2, input_path=write_input('a.wav', 2)))
+    _wait_for(lambda: job.state != QUEUED)
+
+    scheduler.cancel(job.id)
+    time.sleep(0.5)
+
+    assert job.state == CANCELLED
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from spleeter_utils import separate_stream
+
+SAMPLE_RATE = 100
+CHUNK_SECONDS = 2.0
+OVERLAP_SECONDS = 0.5
+WINDOW = int(CHUNK_SECONDS * SAMPLE_RATE)
+OVERLAP = int(OVERLAP_SECONDS * SAMPLE_RATE)
+HOP = WINDOW - OVERLAP
+
+
+class StandInSeparator:
+    """Deterministic per-sample "model", so any seam error shows up exactly"""
+
+    def separate(self, waveform):
+        vocals = np.tanh(3.0 * waveform).astype(np.float32)
+        return {'vocals': vocals, 'accompaniment': waveform - vocals}
+
+
+class WindowMeanSeparator:
+    """
+    Stand-in whose output depends on the whole window: "accompaniment" is
+    the window's mean, so neighbouring windows disagree and only the
+    crossfade keeps the seams continuous
+    """
+
+    def separate(self, waveform):
+        mean = np.broadcast_to(waveform.mean(axis=0), waveform.shape).astype(np.float32)
+        return {'vocals': waveform - mean, 'accompaniment': mean}
+
+
+def _blocks(waveform, size):
+    return [waveform[start:start + size] for start in range(0, len(waveform), size)]
+
+
+def _stream(waveform, block_size, separator=None):
+    chunks = list(separate_stream(separator or StandInSeparator(), _blocks(waveform, block_size),
+                                  SAMPLE_RATE, CHUNK_SECONDS, OVERLAP_SECONDS))
+    return {instrument: np.concatenate([chunk[instrument] for chunk in chunks])
+            for instrument in chunks[0]}
+
+
+@pytest.mark.parametrize('frames', [
+    WINDOW + 2 * HOP,       # ends exactly on a window boundary
+    WINDOW + 2 * HOP + 37,  # not aligned to the windows
+    WINDOW + HOP + 10,      # short tail after the last full window
+    WINDOW // 2,            # shorter than one window
+])
+@pytest.mark.parametrize('block_size', [64, 1000])
+def test_streaming_matches_full_file(frames, block_size):
+    waveform = np.random.RandomState(frames).uniform(-0.5, 0.5, (frames, 2)).astype(np.float32)
+    full = StandInSeparator().separate(waveform)
+
+    streamed = _stream(waveform, block_size)
+
+    assert set(streamed) == set(full)
+    for instrument, data in full.items():
+        assert streamed[instrument].shape == data.shape
+        np.testing.assert_allclose(streamed[instrument], data, rtol=1e-5, atol=1e-6)
+
+
+def _join(separator, waveform, fade):
+    """
+    Reference join of overlapping windows: `fade` is 'linear' (what streaming
+    should do), 'swapped' (fade-in and fade-out mixed up) or 'none' (hard cut)
+    """
+    ramp = np.linspace(0.0, 1.0, OVERLAP, dtype=np.float32)[:, None]
+    weights = {'linear': (1.0 - ramp, ramp), 'swapped': (ramp, 1.0 - ramp),
+               'none': (np.zeros_like(ramp), np.ones_like(ramp))}[fade]
+    output = {}
+    for start in range(0, len(waveform) - OVERLAP, HOP):
+        for instrument, data in separator.separate(waveform[start:start + WINDOW]).items():
+            if instrument not in output:
+                output[instrument] = data.copy()
+                continue
+            joined = output[instrument]
+            joined[-OVERLAP:] = joined[-OVERLAP:] * weights[0] + data[:OVERLAP] * weights[1]
+            output[instrument] = np.concatenate([joined, data[OVERLAP:]])
+    return output
+
+
+def _largest_step(prediction):
+    return max(np.abs(np.diff(data, axis=0)).max() for data in prediction.values())
+
+
+def test_crossfade_keeps_seams_continuous():
+    frames = WINDOW + 6 * HOP
+    t = np.arange(frames, dtype=np.float32)
+    waveform = np.repeat(0.5 * np.sin(2 * np.pi * t / 2000.0)[:, None], 2, axis=1)
+    separator = WindowMeanSeparator()
+
+    streamed = _stream(waveform, 64, separator)
+
+    expected = _join(separator, waveform, 'linear')
+    for instrument, data in expected.items():
+        np.testing.assert_allclose(streamed[instrument], data, rtol=1e-5, atol=1e-6)
+    # The linear crossfade spreads each jump between window means over the overlap
+    signal_step = np.abs(np.diff(waveform, axis=0)).max()
+    cut_step = _largest_step(_join(separator, waveform, 'none'))
+    seam_step = _largest_step(streamed)
+    assert seam_step <= 2 * (signal_step + cut_step / OVERLAP)
+    # ...and a wrong fade leaves them as steps
+    assert _largest_step(_join(separator, waveform, 'swapped')) > 5 * seam_step
+    assert cut_step > 5 * seam_step
+
+
+def test_window_must_exceed_overlap():
+    with pytest.raises(ValueError):
+        list(separate_stream(StandInSeparator(), [np.zeros((10, 2), np.float32)],
+                             SAMPLE_RATE, chunk_seconds=1.0, overlap_seconds=0.5))
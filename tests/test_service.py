@@ -0,0 +1,120 @@
+import asyncio
+import threading
+import wave
+
+import pytest
+
+import spleeter_utils
+from job_scheduler import Job, JobScheduler
+from service import SeparationService, ServiceClient, ServiceError
+
+SAMPLE_RATE = spleeter_utils.SAMPLE_RATE
+
+
+@pytest.fixture
+def service(tmp_path, separator):
+    scheduler = JobScheduler(str(tmp_path / 'temp'), str(tmp_path / 'input'),
+                             str(tmp_path / 'output'))
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = SeparationService(scheduler)
+    asyncio.run_coroutine_threadsafe(server.start('127.0.0.1', 0), loop).result(10)
+    yield ServiceClient(server.address, timeout=10)
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
+    scheduler.shutdown()
+
+
+def test_submit_events_and_files(service, tmp_path, write_input):
+    input_path = write_input('song.wav', 3)
+
+    job = service.submit(2, input_path=input_path)
+    events = list(service.events(job['id']))
+
+    assert events[-1]['state'] == 'done', events[-1]
+    assert all(event['id'] == job['id'] for event in events)
+    files = {f['name']: f['bytes'] for f in service.files(job['id'])}
+    assert {'vocals.wav', 'accompaniment.wav'} <= set(files)
+
+    dest = tmp_path / 'vocals.wav'
+    service.download(job['id'], 'vocals.wav', str(dest))
+    assert dest.stat().st_size == files['vocals.wav']
+    with wave.open(str(dest), 'rb') as wav:
+        assert wav.getnframes() == 3 * SAMPLE_RATE
+
+    with pytest.raises(ServiceError) as error:
+        service.download(job['id'], '../../etc/passwd', str(tmp_path / 'x'))
+    assert error.value.status == 404
+
+
+@pytest.mark.parametrize('seconds', [12, 3])  # longer and shorter than the preview
+def test_preview_then_upgrade(service, tmp_path, write_input, seconds):
+    input_path = write_input('song.wav', seconds)
+
+    preview = service.submit(2, input_path=input_path, preview_seconds=5)
+    assert service.wait(preview['id'])['state'] == 'done'
+    assert any(f['name'].startswith('preview/') for f in service.files(preview['id']))
+
+    full = service.upgrade_preview(preview['id'])
+    final = service.wait(full['id'])
+    assert final['state'] == 'done', final
+    with wave.open(f"{final['output_dir']}/vocals.wav", 'rb') as wav:
+        assert wav.getnframes() == seconds * SAMPLE_RATE
+
+    with pytest.raises(ServiceError) as error:
+        service.upgrade_preview(full['id'])
+    assert error.value.status == 409
+
+
+def test_cancel_running_job(service, separator, tmp_path, write_input):
+    separator.gate.clear()
+    job = service.submit(2, input_path=write_input('song.wav', 3))
+    assert separator.started.wait(10)
+
+    service.cancel(job['id'])
+    separator.gate.set()
+
+    assert service.wait(job['id'])['state'] == 'cancelled'
+
+
+@pytest.mark.parametrize('fields', [
+    {'priority': 'x'},
+    {'priority': True},
+    {'chunk_seconds': -1},
+    {'preview_seconds': 'soon'},
+    {'keep_stems': 'yes'},
+    {'only': 'vocals'},
+    {'only': ['vocals', 3]},
+    {'output_format': 'aiff'},
+    {'colour': 'blue'},
+])
+def test_bad_fields_are_rejected(service, tmp_path, write_input, fields):
+    input_path = write_input('song.wav', 3)
+
+    with pytest.raises(ServiceError) as error:
+        service.submit(2, input_path=input_path, **fields)
+
+    assert error.value.status == 400
+    assert service.jobs() == []
+
+
+def test_missing_input_and_unknown_job(service, tmp_path, write_input):
+    with pytest.raises(ServiceError) as error:
+        service.submit(2, input_path=str(tmp_path / 'missing.wav'))
+    assert error.value.status == 400
+    with pytest.raises(ServiceError) as error:
+        service.job(999999)
+    assert error.value.status == 404
+
+
+def test_scheduler_drops_a_job_it_cannot_queue(tmp_path):
+    scheduler = JobScheduler(str(tmp_path), str(tmp_path), str(tmp_path))
+    try:
+        with pytest.raises(TypeError):
+            scheduler.submit(Job(2, input_path=str(tmp_path / 'song.wav'), priority='x'))
+        assert scheduler.jobs() == []
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PATH = None
+CONCURRENT_JOBS = 1
+CALIBRATION_SECONDS = 10
+THREAD_ENV_VARS = ('TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS', 'OMP_NUM_THREADS')
+
+_applied = None
+_apply_lock = threading.Lock()
+
+
+def configure(profile_path=None, concurrent_jobs=1):
+    """
+    Set where calibrated thread profiles are kept and how many separation
+    processes share this machine's cores
+    """
+    global PROFILE_PATH, CONCURRENT_JOBS
+    PROFILE_PATH = profile_path
+    CONCURRENT_JOBS = max(1, int(concurrent_jobs))
+
+# =============================================================================
+# PROFILES
+# =============================================================================
+def _profile_key(stems, jobs):
+    return f"{int(stems)}:{int(jobs)}"
+
+
+def load_profiles(path=None):
+    path = path or PROFILE_PATH
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profiles(profiles, path=None):
+    path = path or PROFILE_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def default_profile(jobs=1):
+    """Split the cores evenly between concurrent jobs so they never oversubscribe"""
+    cores = os.cpu_count() or 1
+    return {'intra_op': max(1, cores // max(1, jobs)),
+            'inter_op': 2 if jobs == 1 and cores > 1 else 1}
+
+
+def best_profile(stems, jobs=1, path=None):
+    """
+    The calibrated profile for `stems` at this concurrency. Profiles measured
+    at another concurrency are scaled to fit; profiles from a machine with a
+    different core count are ignored.
+    """
+    cores = os.cpu_count() or 1
+    profiles = {key: p for key, p in load_profiles(path).items() if p.get('cpu_count') == cores}
+    exact = profiles.get(_profile_key(stems, jobs))
+    if exact:
+        return exact
+    nearest = [p for key, p in profiles.items() if key.split(':')[0] == str(int(stems))]
+    if not nearest:
+        return default_profile(jobs)
+    nearest = min(nearest, key=lambda p: abs(p['jobs'] - jobs))
+    budget = max(1, cores // max(1, jobs))
+    return {'intra_op': max(1, min(nearest['intra_op'], budget)),
+            'inter_op': 1 if jobs > 1 else nearest['inter_op']}
+
+
+def _set_thread_env(intra_op, inter_op):
+    os.environ['TF_NUM_INTRAOP_THREADS'] = str(intra_op)
+    os.environ['TF_NUM_INTEROP_THREADS'] = str(inter_op)
+    os.environ['OMP_NUM_THREADS'] = str(intra_op)
+
+
+def apply_profile(stems):
+    """
+    Configure TensorFlow's thread pools for `stems` before the first model
+    loads. TensorFlow fixes its pools once per process, so only the first
+    call takes effect; thread counts already set in the environment win.
+    """
+    global _applied
+    with _apply_lock:
+        if _applied is not None:
+            return _applied
+        if any(var in os.environ for var in THREAD_ENV_VARS[:2]):
+            _applied = {'intra_op': int(os.environ.get('TF_NUM_INTRAOP_THREADS', 0)),
+                        'inter_op': int(os.environ.get('TF_NUM_INTEROP_THREADS', 0)),
+                        'source': 'environment'}
+            return _applied
+        profile = best_profile(stems, CONCURRENT_JOBS)
+        # Spleeter runs through a v1 Session with zeroed thread counts, which
+        # falls back to these variables when the runtime starts
+        _set_thread_env(profile['intra_op'], profile['inter_op'])
+        try:
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(profile['intra_op'])
+            tf.config.threading.set_inter_op_parallelism_threads(profile['inter_op'])
+        except (ImportError, RuntimeError) as e:
+            logger.debug(f"TensorFlow threading already initialised: {str(e)}")
+        _applied = dict(profile, source='profile')
+        logger.info(f"TensorFlow threads: intra-op {profile['intra_op']}, "
+                    f"inter-op {profile['inter_op']} ({CONCURRENT_JOBS} concurrent job(s))")
+        return _applied
+
+# =============================================================================
+# CALIBRATION
+# =============================================================================
+def candidate_profiles(jobs=1):
+    """Halving intra-op thread counts within each job's share of the cores"""
+    budget = max(1, (os.cpu_count() or 1) // max(1, jobs))
+    intra_counts = []
+    count = budget
+    while count >= 1:
+        intra_counts.append(count)
+        count //= 2
+    inter_counts = (1, 2) if budget > 1 else (1,)
+    return [{'intra_op': intra, 'inter_op': inter}
+            for intra in intra_counts for inter in inter_counts]
+
+
+def _time_profile(stems, intra_op, inter_op, seconds, repeats):
+    """Runs in a fresh process, since thread pools cannot change once created"""
+    _set_thread_env(intra_op, inter_op)
+    from benchmark import synthesize
+    import spleeter_utils
+
+    clip = synthesize('mix', seconds)
+    spleeter_utils.warm_up_models(stems, background=False)
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with spleeter_utils.MODEL_CACHE.acquire(stems) as separator:
+            separator.separate(clip)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def calibrate(stems, jobs=1, seconds=CALIBRATION_SECONDS, repeats=2, path=None):
+    """
+    Time every candidate profile with `jobs` separations running side by
+    side, store the fastest for `stems` and return it
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for candidate in candidate_profiles(jobs):
+        print(f"⏱️  {stems} stems, {jobs} job(s): intra-op {candidate['intra_op']}, "
+              f"inter-op {candidate['inter_op']} ...", flush=True)
+        with context.Pool(jobs) as pool:
+            pending = [pool.apply_async(_time_profile, (stems, candidate['intra_op'],
+                                                        candidate['inter_op'], seconds, repeats))
+                       for _ in range(jobs)]
+            # Concurrent jobs finish together at the pace of the slowest
+            elapsed = max(p.get() for p in pending)
+        print(f"   {elapsed:.2f}s (RTF {elapsed / seconds:.3f})", flush=True)
+        results.append(dict(candidate, seconds=elapsed))
+
+    best = min(results, key=lambda r: r['seconds'])
+    profile = dict(best, jobs=jobs, cpu_count=os.cpu_count() or 1,
+                   rtf=best['seconds'] / seconds, calibrated=time.time())
+    profiles = load_profiles(path)
+    profiles[_profile_key(stems, jobs)] = profile
+    save_profiles(profiles, path)
+    return profile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the fastest TensorFlow thread settings")
+    parser.add_argument('--stems', default='2', help="Comma-separated stem counts to calibrate")
+    parser.add_argument('--jobs', default='1',
+                        help="Comma-separated numbers of concurrent jobs to calibrate for")
+    parser.add_argument('--seconds', type=float, default=CALIBRATION_SECONDS,
+                        help="Length of the built-in test clip")
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--profile', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          'cache', 'thread_profiles.json'),
+                        help="Where the calibrated profiles are stored")
+    args = parser.parse_args(argv)
+
+    for stems in (int(s) for s in args.stems.split(',')):
+        for jobs in (int(j) for j in args.jobs.split(',')):
+            profile = calibrate(stems, jobs, args.seconds, args.repeats, args.profile)
+            print(f"✅ {stems} stems, {jobs} job(s): intra-op {profile['intra_op']}, "
+                  f"inter-op {profile['inter_op']} (RTF {profile['rtf']:.3f})")
+    print(f"Profiles written to {args.profile}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_PATH = None
+RTF_PATH = None
+_file_lock = threading.Lock()
+
+
+def configure(metrics_path=None, rtf_path=None):
+    """
+    Set where finished spans are appended (JSON lines) and where the
+    measured real-time factors of this machine are kept
+    """
+    global METRICS_PATH, RTF_PATH
+    METRICS_PATH = metrics_path
+    RTF_PATH = rtf_path
+
+# =============================================================================
+# REAL-TIME FACTOR HISTORY (FOR ETAs)
+# =============================================================================
+# Conservative CPU guesses used until this machine has measured itself
+DEFAULT_RTF = {2: 0.25, 4: 0.45, 5: 0.55}
+RTF_SMOOTHING = 0.3
+
+
+def _load_rtf():
+    if not RTF_PATH or not os.path.exists(RTF_PATH):
+        return {}
+    try:
+        with open(RTF_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def realtime_factor(stage, stems):
+    """Seconds of `stage` work per second of audio, as measured on this machine"""
+    measured = _load_rtf().get(f"{stage}:{stems}")
+    if measured is not None:
+        return measured
+    return DEFAULT_RTF.get(int(stems), 0.5) if stage in ('separate', 'stream') else 0.05
+
+
+def record_realtime_factor(stage, stems, seconds, audio_seconds):
+    if not RTF_PATH or not audio_seconds:
+        return
+    with _file_lock:
+        history = _load_rtf()
+        key = f"{stage}:{stems}"
+        rtf = seconds / audio_seconds
+        previous = history.get(key)
+        history[key] = rtf if previous is None else previous + RTF_SMOOTHING * (rtf - previous)
+        try:
+            with open(RTF_PATH + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(history, f, indent=2)
+            os.replace(RTF_PATH + '.tmp', RTF_PATH)
+        except OSError as e:
+            logger.warning(f"Could not save real-time factors: {str(e)}")
+
+# =============================================================================
+# SPANS AND PROGRESS
+# =============================================================================
+class Span:
+    """One timed stage of a separation"""
+
+    def __init__(self, tracer, stage, **fields):
+        self.tracer = tracer
+        self.stage = stage
+        self.fields = fields
+        self.start = None
+        self.duration = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.fields['error'] = str(exc).split('\n')[0]
+        self.tracer._finish_span(self)
+        return False
+
+    def to_dict(self):
+        return dict(stage=self.stage, duration=self.duration, **self.fields)
+
+
+class Tracer:
+    """
+    Collects structured spans (stage, duration, bytes, samples) for one
+    separation and reports fractional progress with an ETA to
+    `progress_callback(fraction, stage, eta_seconds)`
+    """
+
+    def __init__(self, progress_callback=None, label=None, metrics_path=None):
+        self.progress_callback = progress_callback
+        self.label = label
+        self.metrics_path = metrics_path or METRICS_PATH
+        self.spans = []
+        self.fraction = 0.0
+        self.started = time.perf_counter()
+        self._expectation = None
+
+    def span(self, stage, **fields):
+        return Span(self, stage, **fields)
+
+    def _finish_span(self, span):
+        self.expect_done()
+        self.spans.append(span)
+        record = span.to_dict()
+        logger.info(f"[trace] {record}")
+        if self.metrics_path:
+            record.update(label=self.label, time=time.time())
+            with _file_lock:
+                try:
+                    with open(self.metrics_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record) + '\n')
+                except OSError as e:
+                    logger.warning(f"Could not write metrics: {str(e)}")
+
+    def progress(self, fraction, stage, eta_seconds=None):
+        self.fraction = max(self.fraction, min(1.0, fraction))
+        if eta_seconds is None and self.fraction > 0:
+            elapsed = time.perf_counter() - self.started
+            eta_seconds = elapsed * (1.0 - self.fraction) / self.fraction
+        if self.progress_callback:
+            try:
+                self.progress_callback(self.fraction, stage, eta_seconds)
+            except Exception as e:
+                logger.warning(f"Progress callback failed: {str(e)}")
+
+    def expect(self, stage, seconds, start_fraction, end_fraction, interval=0.5):
+        """
+        Interpolate progress from `start_fraction` to `end_fraction` over the
+        expected `seconds` of a blocking call (e.g. model inference), never
+        quite reaching the end until the stage actually finishes
+        """
+        self.expect_done()
+        if not self.progress_callback:
+            return
+        stop = threading.Event()
+        begin = time.perf_counter()
+
+        def _tick():
+            while not stop.wait(interval):
+                elapsed = time.perf_counter() - begin
+                share = min(0.95, elapsed / seconds) if seconds > 0 else 0.95
+                self.progress(start_fraction + (end_fraction - start_fraction) * share, stage,
+                              eta_seconds=max(0.0, seconds - elapsed))
+
+        thread = threading.Thread(target=_tick, daemon=True, name=f"progress-{stage}")
+        self._expectation = stop
+        thread.start()
+
+    def expect_done(self):
+        if self._expectation is not None:
+            self._expectation.set()
+            self._expectation = None
+
+    def summary(self):
+        return [span.to_dict() for span in self.spans]